@@ -4,12 +4,19 @@
 ヨドバシ.com の購入履歴情報を収集して，Excel ファイルとして出力します．
 
 Usage:
-  yodhist.py [-c CONFIG] [-e] [-N]
+  yodhist.py [-c CONFIG] [-e] [-N] [-F] [-R] [-X]
+  yodhist.py [-c CONFIG] -C [-N] [-F] [-R] [-X]
+  yodhist.py [-c CONFIG] -P [-N] [-F]
 
 Options:
   -c CONFIG     : CONFIG を設定ファイルとして読み込んで実行します．[default: config.yaml]
   -e            : データ収集は行わず，Excel ファイルの出力のみ行います．
+  -C            : 注文履歴の収集は行わず，未取得の商品カテゴリの補完と Excel ファイルの出力のみ行います．
   -N            : サムネイル画像を含めないようにします．
+  -F            : Excel ファイルに追記せず，全体を作り直します．
+  -R            : 巡回したページの HTML を記録します．
+  -P            : Web ブラウザは使わず，記録しておいたページを再解析して Excel ファイルを出力します．
+  -X            : Web ブラウザのキャッシュを削除してから実行します．
 """
 
 import logging
@@ -17,6 +24,8 @@ import random
 
 import store_yodobashi.handle
 import store_yodobashi.crawler
+import store_yodobashi.category
+import store_yodobashi.replay
 import store_yodobashi.order_history
 import local_lib.selenium_util
 
@@ -24,9 +33,11 @@ NAME = "yodhist"
 VERSION = "0.1.0"
 
 
-def execute_fetch(handle):
+def execute_fetch(handle, is_category_only=False):
     try:
-        store_yodobashi.crawler.fetch_order_item_list(handle)
+        if not is_category_only:
+            store_yodobashi.crawler.fetch_order_item_list(handle)
+        store_yodobashi.category.fetch_pending_category(handle)
     except:
         driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
         local_lib.selenium_util.dump_page(
@@ -35,14 +46,27 @@ def execute_fetch(handle):
         raise
 
 
-def execute(config, is_export_mode=False, is_need_thumb=True):
+def execute(
+    config,
+    is_export_mode=False,
+    is_need_thumb=True,
+    is_category_only=False,
+    is_record_mode=False,
+    is_replay_mode=False,
+    is_clear_cache=False,
+    is_full_rebuild=False,
+):
     handle = store_yodobashi.handle.create(config)
+    store_yodobashi.handle.set_record_mode(handle, is_record_mode)
+    store_yodobashi.handle.set_clear_browser_cache(handle, is_clear_cache)
 
     try:
-        if not is_export_mode:
-            execute_fetch(handle)
+        if is_replay_mode:
+            store_yodobashi.replay.replay(handle)
+        elif not is_export_mode:
+            execute_fetch(handle, is_category_only)
         store_yodobashi.order_history.generate_table_excel(
-            handle, store_yodobashi.handle.get_excel_file_path(handle), is_need_thumb
+            handle, store_yodobashi.handle.get_excel_file_path(handle), is_need_thumb, is_full_rebuild
         )
 
         store_yodobashi.handle.finish(handle)
@@ -68,7 +92,21 @@ if __name__ == "__main__":
     config_file = args["-c"]
     is_export_mode = args["-e"]
     is_need_thumb = not args["-N"]
+    is_category_only = args["-C"]
+    is_record_mode = args["-R"]
+    is_replay_mode = args["-P"]
+    is_clear_cache = args["-X"]
+    is_full_rebuild = args["-F"]
 
     config = local_lib.config.load(args["-c"])
 
-    execute(config, is_export_mode, is_need_thumb)
+    execute(
+        config,
+        is_export_mode,
+        is_need_thumb,
+        is_category_only,
+        is_record_mode,
+        is_replay_mode,
+        is_clear_cache,
+        is_full_rebuild,
+    )
@@ -1,8 +1,85 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import concurrent.futures
+import copy
+import hashlib
+import io
+import json
+import logging
+import os
+import pathlib
+import traceback
+import types
+import zipfile
+
+import PIL.Image
+
+import openpyxl.cell
 import openpyxl.utils
 import openpyxl.styles
 import openpyxl.drawing.image
+import openpyxl.writer.excel
+
+import local_lib.thumb_store
+
+IMAGE_MARGIN_PIX = 2
+# NOTE: 縮小版の作成は PIL が GIL を解放するので，CPU の数だけ並列に行う
+PREPARE_WORKER_COUNT = os.cpu_count() or 1
+# NOTE: 書き出し方を変えた場合はこれを上げて，既存のファイルへの追記をさせないようにする
+MANIFEST_VERSION = 1
+
+
+# NOTE: これ以外の形式の画像は，openpyxl と同様に PNG に変換して埋め込む
+NATIVE_IMAGE_FORMAT_LIST = ["gif", "jpeg", "png"]
+
+
+class SharedImage(openpyxl.drawing.image.Image):
+    # NOTE: 内容が同じ画像は，ブック内で1つの画像パーツを共有する．
+    # 画像データは書き出す時に読み直すので，行数が多くてもメモリ上には保持しない．
+    # 大きさは事前に調べたものを使い，ここでは画像を開かない．
+    def __init__(self, digest, loader, width, height, format):
+        self.ref = None
+        self.digest = digest
+        self.loader = loader
+        self.width = width
+        self.height = height
+        self.format = format
+
+    def _data(self):
+        data = self.loader()
+        if self.format in NATIVE_IMAGE_FORMAT_LIST:
+            return data
+
+        self.ref = io.BytesIO(data)
+        data = super()._data()
+        self.ref = None
+
+        return data
+
+    @property
+    def path(self):
+        # NOTE: コンテンツタイプは拡張子から決まるので，変換した画像は png の拡張子にする
+        return "/xl/media/image_{digest}.{ext}".format(
+            digest=self.digest, ext=self.format if self.format in NATIVE_IMAGE_FORMAT_LIST else "png"
+        )
+
+
+class SharedImageWriter(openpyxl.writer.excel.ExcelWriter):
+    # NOTE: openpyxl の非公開メソッドを置き換えているので，pyproject.toml で openpyxl のバージョンを
+    # 3.1 系に固定している．更新する際は ExcelWriter._write_images の実装を確認すること
+    def _write_images(self):
+        path_set = set()
+        for img in self._images:
+            if img.path in path_set:
+                continue
+            path_set.add(img.path)
+
+            self._archive.writestr(img.path[1:], img._data())
+
+
+def save_book(book, file_path):
+    with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        SharedImageWriter(book, archive).save()
 
 
 def gen_text_pos(row, col):
@@ -12,157 +89,306 @@ def gen_text_pos(row, col):
     )
 
 
-def set_header_cell_style(sheet, row, col, value, width, style):
-    sheet.cell(row, col).value = value
-    sheet.cell(row, col).style = "Normal"
-    sheet.cell(row, col).border = style["border"]
-    sheet.cell(row, col).fill = style["fill"]
+def gen_cell_func(sheet, row, row_cell_map):
+    if row_cell_map is None:
+        return lambda col: sheet.cell(row, col)
+
+    # NOTE: ストリーミング書き出しでは，1行分のセルを作ってからまとめて追記する
+    return lambda col: row_cell_map.setdefault(col, openpyxl.cell.WriteOnlyCell(sheet))
+
+
+def append_row(sheet, row_cell_map):
+    sheet.append([row_cell_map.get(col, None) for col in range(1, max(row_cell_map.keys(), default=0) + 1)])
+
+
+def register_style(book, name, style):
+    # NOTE: 名前付きスタイルとしてブックに登録しておき，セルには名前を1回設定するだけで済ませる
+    if name not in book.named_styles:
+        book.add_named_style(style)
 
-    if width is not None:
-        sheet.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
+    return name
 
 
-def insert_table_header(sheet, row, sheet_def, base_style):
+def gen_header_cell_style(book, base_style):
+    return register_style(
+        book,
+        "table_header",
+        openpyxl.styles.NamedStyle(
+            name="table_header",
+            font=copy.copy(book._named_styles["Normal"].font),
+            border=base_style["border"],
+            fill=base_style["fill"],
+        ),
+    )
+
+
+def set_header_cell_style(cell, value, style):
+    cell.value = value
+    cell.style = style
+
+
+def setting_table_column(sheet, sheet_def):
+    for key in sheet_def["TABLE_HEADER"]["col"].keys():
+        if "width" not in sheet_def["TABLE_HEADER"]["col"][key]:
+            continue
+
+        col = sheet_def["TABLE_HEADER"]["col"][key]["pos"]
+        for i in range(sheet_def["TABLE_HEADER"]["col"][key].get("length", 1)):
+            sheet.column_dimensions[openpyxl.utils.get_column_letter(col + i)].width = sheet_def[
+                "TABLE_HEADER"
+            ]["col"][key]["width"]
+
+
+def insert_table_header(sheet, row, sheet_def, header_style, cell_func):
     for key in sheet_def["TABLE_HEADER"]["col"].keys():
         col = sheet_def["TABLE_HEADER"]["col"][key]["pos"]
-        if "width" in sheet_def["TABLE_HEADER"]["col"][key]:
-            width = sheet_def["TABLE_HEADER"]["col"][key]["width"]
-        else:
-            width = None
 
         if key == "category":
             for i in range(sheet_def["TABLE_HEADER"]["col"][key]["length"]):
                 set_header_cell_style(
-                    sheet,
-                    row,
-                    col + i,
+                    cell_func(col + i),
                     sheet_def["TABLE_HEADER"]["col"][key]["label"] + " ({i})".format(i=i + 1),
-                    width,
-                    base_style,
+                    header_style,
                 )
         else:
             set_header_cell_style(
-                sheet, row, col, sheet_def["TABLE_HEADER"]["col"][key]["label"], width, base_style
+                cell_func(col), sheet_def["TABLE_HEADER"]["col"][key]["label"], header_style
             )
 
 
-def gen_item_cell_style(base_style, cell_def):
-    style = base_style.copy()
-
-    if "format" in cell_def:
-        style["text_format"] = cell_def["format"]
+def gen_item_cell_style(book, base_style, key, cell_def):
+    name = "table_item_{key}".format(key=key)
 
-    if "wrap" in cell_def:
-        style["text_wrap"] = cell_def["wrap"]
+    if key == "image":
+        style = openpyxl.styles.NamedStyle(
+            name=name, font=copy.copy(book._named_styles["Normal"].font), border=base_style["border"]
+        )
     else:
-        style["text_wrap"] = False
+        style = openpyxl.styles.NamedStyle(
+            name=name,
+            font=copy.copy(book._named_styles["Normal"].font),
+            border=base_style["border"],
+            alignment=openpyxl.styles.Alignment(wrap_text=cell_def.get("wrap", False), vertical="top"),
+            number_format=cell_def.get("format", "General"),
+        )
 
-    return style
+    return register_style(book, name, style)
 
 
-def set_item_cell_style(sheet, row, col, value, style):
-    sheet.cell(row, col).value = value
-    sheet.cell(row, col).style = "Normal"
-    sheet.cell(row, col).border = style["border"]
-    sheet.cell(row, col).alignment = openpyxl.styles.Alignment(wrap_text=style["text_wrap"], vertical="top")
+def gen_category_value_func(key, index):
+    # NOTE: カテゴリが未取得 (None) の場合は空欄にする
+    return lambda item: item[key][index] if (item[key] is not None) and (index < len(item[key])) else ""
 
-    if "text_format" in style:
-        sheet.cell(row, col).number_format = style["text_format"]
 
+def gen_item_value_func(key, cell_def):
+    is_optional = cell_def.get("optional", False)
+    is_fixed = "value" in cell_def
+    fixed_value = cell_def.get("value", None)
+    value_key = cell_def.get("formal_key", key)
+    conv_func = cell_def.get("conv_func", None)
+
+    def get_value(item):
+        if is_optional and (key not in item):
+            return None
+
+        value = fixed_value if is_fixed else item[value_key]
+
+        return value if conv_func is None else conv_func(value)
+
+    return get_value
 
-def insert_table_item(sheet, row, item, is_need_thumb, thumb_path, sheet_def, base_style):
-    for key in sheet_def["TABLE_HEADER"]["col"].keys():
-        col = sheet_def["TABLE_HEADER"]["col"][key]["pos"]
 
-        cell_style = gen_item_cell_style(base_style, sheet_def["TABLE_HEADER"]["col"][key])
+def compile_table_item(book, sheet_def, base_style):
+    # NOTE: 行ごとに sheet_def を解釈し直さなくて済むよう，列ごとの書き出し方をまとめておく
+    item_plan = []
+    for key, cell_def in sheet_def["TABLE_HEADER"]["col"].items():
+        col = cell_def["pos"]
+        style = gen_item_cell_style(book, base_style, key, cell_def)
+        link_func = cell_def.get("link_func", None)
 
         if key == "category":
-            for i in range(sheet_def["TABLE_HEADER"]["col"][key]["length"]):
-                if i < len(item["category"]):
-                    value = item[key][i]
-                else:
-                    value = ""
-                set_item_cell_style(sheet, row, col + i, value, cell_style)
-        elif key == "image":
-            sheet.cell(row, col).border = cell_style["border"]
-            if is_need_thumb:
-                insert_table_cell_image(
-                    sheet,
-                    row,
-                    col,
-                    thumb_path,
-                    sheet_def["TABLE_HEADER"]["col"]["image"]["width"],
-                    sheet_def["TABLE_HEADER"]["row"]["height"],
+            for i in range(cell_def["length"]):
+                item_plan.append(
+                    {
+                        "col": col + i,
+                        "style": style,
+                        "value_func": gen_category_value_func(key, i),
+                        "link_func": link_func,
+                    }
                 )
+        elif key == "image":
+            item_plan.append({"col": col, "style": style, "value_func": None, "link_func": link_func})
         else:
-            if (
-                ("optional" in sheet_def["TABLE_HEADER"]["col"][key])
-                and sheet_def["TABLE_HEADER"]["col"][key]["optional"]
-                and (key not in item)
-            ):
-                value = None
-            else:
-                if "value" in sheet_def["TABLE_HEADER"]["col"][key]:
-                    value = sheet_def["TABLE_HEADER"]["col"][key]["value"]
-                elif "formal_key" in sheet_def["TABLE_HEADER"]["col"][key]:
-                    value = item[sheet_def["TABLE_HEADER"]["col"][key]["formal_key"]]
-                else:
-                    value = item[key]
-
-                if "conv_func" in sheet_def["TABLE_HEADER"]["col"][key]:
-                    value = sheet_def["TABLE_HEADER"]["col"][key]["conv_func"](value)
-
-            set_item_cell_style(sheet, row, col, value, cell_style)
-
-        if "link_func" in sheet_def["TABLE_HEADER"]["col"][key]:
-            sheet.cell(row, col).hyperlink = sheet_def["TABLE_HEADER"]["col"][key]["link_func"](item)
-
-
-def insert_table_cell_image(sheet, row, col, thumb_path, cell_width, cell_height):
-    if (thumb_path is None) or (not thumb_path.exists()):
-        return
+            item_plan.append(
+                {
+                    "col": col,
+                    "style": style,
+                    "value_func": gen_item_value_func(key, cell_def),
+                    "link_func": link_func,
+                }
+            )
+
+    return item_plan
+
+
+def insert_table_item(sheet, row, item, is_need_thumb, thumb_store, thumb_info, item_plan, cell_func):
+    for col_plan in item_plan:
+        cell = cell_func(col_plan["col"])
+        cell.style = col_plan["style"]
+
+        if col_plan["value_func"] is not None:
+            cell.value = col_plan["value_func"](item)
+        elif is_need_thumb:
+            insert_table_cell_image(sheet, row, col_plan["col"], thumb_store, thumb_info)
+
+        if col_plan["link_func"] is not None:
+            cell.hyperlink = col_plan["link_func"](item)
 
-    img = openpyxl.drawing.image.Image(thumb_path)
 
+def get_cell_size_pix(cell_width, cell_height):
     # NOTE: マジックナンバー「8」は下記等を参考にして設定．(日本語フォントだと 8 が良さそう)
     # > In all honesty, I cannot tell you how many blogs and stack overflow answers
     # > I read before I stumbled across this magic number: 7.5
     # https://imranhugo.medium.com/how-to-right-align-an-image-in-excel-cell-using-python-and-openpyxl-7ca75a85b13a
-    cell_width_pix = cell_width * 8
-    cell_height_pix = openpyxl.utils.units.points_to_pixels(cell_height)
+    return (cell_width * 8, openpyxl.utils.units.points_to_pixels(cell_height))
+
+
+def get_image_box_size(cell_width, cell_height):
+    cell_width_pix, cell_height_pix = get_cell_size_pix(cell_width, cell_height)
+
+    return (int(cell_width_pix - (IMAGE_MARGIN_PIX * 2)), int(cell_height_pix - (IMAGE_MARGIN_PIX * 2)))
+
+
+def get_image_size(thumb_store, thumb_key):
+    info = local_lib.thumb_store.get_info(thumb_store, thumb_key)
+
+    if info is None:
+        image = local_lib.thumb_store.open_image(thumb_store, thumb_key)
+        if image is None:
+            return None
+
+        # NOTE: 画像のヘッダだけ読んで大きさを調べ，次回以降は画像を開かなくて済むよう記録しておく
+        with PIL.Image.open(image) as img:
+            info = {
+                "width": img.width,
+                "height": img.height,
+                "format": "png" if img.format is None else img.format.lower(),
+            }
+        local_lib.thumb_store.set_info(thumb_store, thumb_key, info)
+
+    return info
+
+
+def gen_image_geometry(image_size, cell_width, cell_height):
+    cell_width_pix, cell_height_pix = get_cell_size_pix(cell_width, cell_height)
 
     cell_width_emu = openpyxl.utils.units.pixels_to_EMU(cell_width_pix)
     cell_height_emu = openpyxl.utils.units.pixels_to_EMU(cell_height_pix)
 
-    margin_pix = 2
-    content_width_pix = cell_width_pix - (margin_pix * 2)
-    content_height_pix = cell_height_pix - (margin_pix * 2)
+    content_width_pix = cell_width_pix - (IMAGE_MARGIN_PIX * 2)
+    content_height_pix = cell_height_pix - (IMAGE_MARGIN_PIX * 2)
 
     content_ratio = content_width_pix / content_height_pix
-    image_ratio = img.width / img.height
+    image_ratio = image_size["width"] / image_size["height"]
 
-    if (img.width > content_width_pix) or (img.height > content_height_pix):
+    width = image_size["width"]
+    height = image_size["height"]
+    if (width > content_width_pix) or (height > content_height_pix):
         if image_ratio > content_ratio:
             # NOTE: 画像の横幅をセルの横幅に合わせる
-            scale = content_width_pix / img.width
+            scale = content_width_pix / width
         else:
             # NOTE: 画像の高さをセルの高さに合わせる
-            scale = content_height_pix / img.height
+            scale = content_height_pix / height
+
+        width *= scale
+        height *= scale
+
+    image_width_emu = openpyxl.utils.units.pixels_to_EMU(width)
+    image_height_emu = openpyxl.utils.units.pixels_to_EMU(height)
+
+    return {
+        "width": width,
+        "height": height,
+        "format": image_size["format"],
+        "col_offset": (cell_width_emu - image_width_emu) / 2,
+        "row_offset": (cell_height_emu - image_height_emu) / 2,
+    }
+
+
+def prepare_thumb_image(thumb_store, thumb_key_func, item):
+    try:
+        thumb_key = thumb_key_func(item)
+        if thumb_key is None:
+            return None
+
+        digest = local_lib.thumb_store.get_hash(thumb_store, thumb_key)
+        if digest is None:
+            return None
+
+        image_size = get_image_size(thumb_store, thumb_key)
+        if image_size is None:
+            logging.warning("Thumbnail is not found: {id}".format(id=item["id"]))
+            return None
+
+        return {"key": thumb_key, "hash": digest, "size": image_size}
+    except:
+        logging.warning("Failed to prepare thumbnail: {id}".format(id=item["id"]))
+        logging.debug(traceback.format_exc())
+        return None
+
+
+def prepare_thumb_image_list(item_list, sheet_def, thumb_store, thumb_key_func):
+    cell_width = sheet_def["TABLE_HEADER"]["col"]["image"]["width"]
+    cell_height = sheet_def["TABLE_HEADER"]["row"]["height"]
+
+    # NOTE: 縮小版の作成や大きさの取得は，行の書き出しとは別にまとめて並列に行う
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=PREPARE_WORKER_COUNT, thread_name_prefix="thumb_prepare"
+    ) as executor:
+        thumb_info_list = list(
+            executor.map(lambda item: prepare_thumb_image(thumb_store, thumb_key_func, item), item_list)
+        )
+
+    # NOTE: 内容が同じ画像は配置も同じになるので，並列処理が終わってから1回だけ計算する
+    geometry_map = {}
+    for thumb_info in thumb_info_list:
+        if thumb_info is None:
+            continue
+
+        image_size = thumb_info.pop("size")
+        if thumb_info["hash"] not in geometry_map:
+            geometry_map[thumb_info["hash"]] = gen_image_geometry(image_size, cell_width, cell_height)
+        thumb_info["geometry"] = geometry_map[thumb_info["hash"]]
+
+    return thumb_info_list
+
+
+def create_thumb_image(thumb_store, thumb_info):
+    if thumb_info is None:
+        return None
+
+    return SharedImage(
+        thumb_info["hash"],
+        lambda: local_lib.thumb_store.get(thumb_store, thumb_info["key"]),
+        thumb_info["geometry"]["width"],
+        thumb_info["geometry"]["height"],
+        thumb_info["geometry"]["format"],
+    )
 
-        img.width *= scale
-        img.height *= scale
 
-    image_width_emu = openpyxl.utils.units.pixels_to_EMU(img.width)
-    image_height_emu = openpyxl.utils.units.pixels_to_EMU(img.height)
+def insert_table_cell_image(sheet, row, col, thumb_store, thumb_info):
+    img = create_thumb_image(thumb_store, thumb_info)
+    if img is None:
+        return
 
-    col_offset_emu = (cell_width_emu - image_width_emu) / 2
-    row_offset_emu = (cell_height_emu - image_height_emu) / 2
+    geometry = thumb_info["geometry"]
 
     marker_1 = openpyxl.drawing.spreadsheet_drawing.AnchorMarker(
-        col=col - 1, row=row - 1, colOff=col_offset_emu, rowOff=row_offset_emu
+        col=col - 1, row=row - 1, colOff=geometry["col_offset"], rowOff=geometry["row_offset"]
     )
     marker_2 = openpyxl.drawing.spreadsheet_drawing.AnchorMarker(
-        col=col, row=row, colOff=-col_offset_emu, rowOff=-row_offset_emu
+        col=col, row=row, colOff=-geometry["col_offset"], rowOff=-geometry["row_offset"]
     )
 
     img.anchor = openpyxl.drawing.spreadsheet_drawing.TwoCellAnchor(_from=marker_1, to=marker_2)
@@ -192,48 +418,191 @@ def setting_table_view(sheet, sheet_def, row_last, is_hidden):
     sheet.sheet_view.showGridLines = False
 
 
+def encode_signature_value(value):
+    if callable(value):
+        # NOTE: 関数はアドレスが毎回変わるので，処理の内容で比較する
+        code = value.__code__
+        return hashlib.sha256(
+            code.co_code
+            + repr([const for const in code.co_consts if not isinstance(const, types.CodeType)]).encode()
+            + repr(code.co_names).encode()
+        ).hexdigest()
+
+    return repr(value)
+
+
+def gen_sheet_signature(sheet_def, font, is_need_thumb):
+    return hashlib.sha256(
+        json.dumps(
+            {
+                "version": MANIFEST_VERSION,
+                "sheet_def": sheet_def,
+                "font": [font.name, font.sz],
+                "thumb": is_need_thumb,
+            },
+            default=encode_signature_value,
+            sort_keys=True,
+            ensure_ascii=False,
+        ).encode()
+    ).hexdigest()
+
+
+def gen_manifest_item_list(item_list, thumb_info_list):
+    # NOTE: 商品の内容とサムネイルのハッシュ値から，書き出した内容が同じかどうかを判断する
+    return [
+        [
+            item["no"],
+            item["id"],
+            hashlib.sha1(
+                repr(
+                    (
+                        [(key, item[key]) for key in item.keys()],
+                        None if thumb_info is None else thumb_info["hash"],
+                    )
+                ).encode()
+            ).hexdigest(),
+        ]
+        for item, thumb_info in zip(item_list, thumb_info_list)
+    ]
+
+
+def get_file_stat(file_path):
+    stat = pathlib.Path(file_path).stat()
+
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def load_manifest(manifest_path, excel_file, signature):
+    try:
+        manifest_path = pathlib.Path(manifest_path)
+        if not manifest_path.exists() or not pathlib.Path(excel_file).exists():
+            return None
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if manifest["signature"] != signature:
+            logging.info("Sheet definition is changed")
+            return None
+
+        # NOTE: Excel で編集された場合などは，追記せずに作り直す
+        if (manifest["file"]["path"] != str(pathlib.Path(excel_file).resolve())) or (
+            manifest["file"]["stat"] != get_file_stat(excel_file)
+        ):
+            logging.info("Excel file is modified")
+            return None
+
+        return manifest["item"]
+    except:
+        logging.warning("Failed to load manifest")
+        logging.debug(traceback.format_exc())
+        return None
+
+
+def store_manifest(manifest_path, excel_file, signature, manifest_item_list):
+    manifest_path = pathlib.Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "signature": signature,
+                "file": {"path": str(pathlib.Path(excel_file).resolve()), "stat": get_file_stat(excel_file)},
+                "item": manifest_item_list,
+            },
+            f,
+            ensure_ascii=False,
+        )
+
+
+def get_written_count(base_manifest_item_list, manifest_item_list):
+    # NOTE: 書き出し済みの商品が全て変わらずに先頭に並んでいる場合だけ，後ろに追記できる
+    count = len(base_manifest_item_list)
+    if (count == 0) or (count > len(manifest_item_list)):
+        return None
+
+    if manifest_item_list[:count] != base_manifest_item_list:
+        logging.info("Written items are changed")
+        return None
+
+    return count
+
+
 def generate_list_sheet(
     book,
     item_list,
     sheet_def,
     is_need_thumb,
-    thumb_path_func,
+    thumb_store,
+    thumb_info_list,
     set_status_func,
     update_seq_func,
     update_item_func,
+    skip_count=0,
 ):
     sheet = book.create_sheet()
     sheet.title = "{label}アイテム一覧".format(label=sheet_def["SHEET_TITLE"])
 
+    # NOTE: write_only のブックでは，セルの内容は行を順に書き出してメモリに保持しない．
+    # 画像の配置とハイパーリンクは openpyxl が保存時にまとめて書き出すので，保存までは保持される
+    is_stream = book.write_only
+
     side = openpyxl.styles.Side(border_style="thin", color="000000")
     border = openpyxl.styles.Border(top=side, left=side, right=side, bottom=side)
     fill = openpyxl.styles.PatternFill(patternType="solid", fgColor="F2F2F2")
 
     base_style = {"border": border, "fill": fill}
 
+    header_style = gen_header_cell_style(book, base_style)
+    item_plan = compile_table_item(book, sheet_def, base_style)
+
     row = sheet_def["TABLE_HEADER"]["row"]["pos"]
+    row_last = row + len(item_list)
+
+    # NOTE: ストリーミング書き出しでは列幅やウィンドウ枠の固定を先頭に書き出すので，行より先に設定する
+    set_status_func("テーブルの表示設定しています...")
+    setting_table_column(sheet, sheet_def)
+    setting_table_view(sheet, sheet_def, row_last, not is_need_thumb)
+
+    update_seq_func()
 
     set_status_func("テーブルのヘッダを設定しています...")
-    insert_table_header(sheet, row, sheet_def, base_style)
+    if is_stream:
+        for i in range(row - 1):
+            sheet.append([])
+
+    row_cell_map = {} if is_stream else None
+    insert_table_header(sheet, row, sheet_def, header_style, gen_cell_func(sheet, row, row_cell_map))
+    if is_stream:
+        append_row(sheet, row_cell_map)
 
     update_seq_func()
 
     set_status_func("{label} - 商品の記載をしています...".format(label=sheet_def["SHEET_TITLE"]))
 
-    row += 1
-    for item in item_list:
+    # NOTE: 追記する場合は，書き出し済みの商品を飛ばしてその次の行から記載する
+    row += 1 + skip_count
+    for item, thumb_info in zip(item_list[skip_count:], thumb_info_list[skip_count:]):
         sheet.row_dimensions[row].height = sheet_def["TABLE_HEADER"]["row"]["height"]
-        insert_table_item(sheet, row, item, is_need_thumb, thumb_path_func(item), sheet_def, base_style)
+
+        row_cell_map = {} if is_stream else None
+        insert_table_item(
+            sheet,
+            row,
+            item,
+            is_need_thumb,
+            thumb_store,
+            thumb_info,
+            item_plan,
+            gen_cell_func(sheet, row, row_cell_map),
+        )
+        if is_stream:
+            append_row(sheet, row_cell_map)
+            # NOTE: 書き出し済みの行の情報は不要なので破棄する
+            del sheet.row_dimensions[row]
         update_item_func()
 
         row += 1
 
-    row_last = row - 1
-
     update_item_func()
     update_seq_func()
-
-    set_status_func("テーブルの表示設定しています...")
-    setting_table_view(sheet, sheet_def, row_last, not is_need_thumb)
-
-    update_seq_func()
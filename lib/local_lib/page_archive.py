@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Web ページの HTML を，内容のハッシュをキーとして圧縮保存します．
+
+Usage:
+  page_archive.py -a ARCHIVE [-k KIND]
+
+Options:
+  -a ARCHIVE    : アーカイブのフォルダを指定します．
+  -k KIND       : 一覧表示するページの種類を指定します．
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+import traceback
+
+INDEX_FILE_NAME = "index.jsonl"
+OBJECT_DIR_NAME = "object"
+
+
+def get_object_path(archive, digest):
+    return archive["path"] / OBJECT_DIR_NAME / digest[:2] / (digest + ".html.gz")
+
+
+def load_index(archive_path):
+    index = {}
+
+    index_path = archive_path / INDEX_FILE_NAME
+    if not index_path.exists():
+        return index
+
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except:
+                # NOTE: 書き込み途中で中断した行は無視する
+                logging.warning("Broken index entry is ignored")
+                continue
+
+            # NOTE: 同じページは後に記録したものを優先する
+            index.setdefault(entry["kind"], {})[entry["key"]] = entry
+
+    return index
+
+
+def create(archive_path):
+    archive_path = pathlib.Path(archive_path)
+    archive_path.mkdir(parents=True, exist_ok=True)
+
+    return {
+        "path": archive_path,
+        "index": load_index(archive_path),
+        "lock": threading.Lock(),
+    }
+
+
+def store(archive, kind, key, url, page_source):
+    data = page_source.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+
+    object_path = get_object_path(archive, digest)
+
+    try:
+        if not object_path.exists():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+
+            f = tempfile.NamedTemporaryFile(dir=str(object_path.parent), delete=False)
+            f.write(gzip.compress(data))
+            f.close()
+
+            os.replace(f.name, object_path)
+
+        entry = {
+            "kind": kind,
+            "key": str(key),
+            "url": url,
+            "hash": digest,
+            "time": datetime.datetime.now().isoformat(),
+        }
+
+        with archive["lock"]:
+            with open(archive["path"] / INDEX_FILE_NAME, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+            archive["index"].setdefault(kind, {})[entry["key"]] = entry
+    except:
+        logging.error(traceback.format_exc())
+
+    return digest
+
+
+def get_key_list(archive, kind):
+    return list(archive["index"].get(kind, {}).keys())
+
+
+def exists(archive, kind, key):
+    return str(key) in archive["index"].get(kind, {})
+
+
+def load(archive, kind, key):
+    entry = archive["index"].get(kind, {}).get(str(key), None)
+    if entry is None:
+        return None
+
+    with open(get_object_path(archive, entry["hash"]), "rb") as f:
+        return {"url": entry["url"], "page_source": gzip.decompress(f.read()).decode("utf-8")}
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import logger
+
+    args = docopt(__doc__)
+
+    logger.init("test", level=logging.INFO)
+
+    archive = create(args["-a"])
+
+    for kind in archive["index"].keys() if args["-k"] is None else [args["-k"]]:
+        key_list = get_key_list(archive, kind)
+        logging.info("{kind}: {count:,} pages".format(kind=kind, count=len(key_list)))
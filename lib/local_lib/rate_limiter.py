@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+トークンバケット方式でアクセス頻度を制限します．
+
+Usage:
+  rate_limiter.py [-r RATE] [-b BURST] [-j JITTER] [-n COUNT]
+
+Options:
+  -r RATE       : 1分あたりのリクエスト数．[default: 30]
+  -b BURST      : 連続して許容するリクエスト数．[default: 1]
+  -j JITTER     : 待ち時間に加えるゆらぎの割合．[default: 0.2]
+  -n COUNT      : 試行回数．[default: 5]
+"""
+
+import logging
+import random
+import threading
+import time
+
+
+def create(request_per_minute, burst=1, jitter=0.0):
+    return {
+        "interval": 60.0 / request_per_minute,
+        "burst": burst,
+        "jitter": jitter,
+        "token": float(burst),
+        "last": time.monotonic(),
+        "lock": threading.Lock(),
+    }
+
+
+def acquire(limiter):
+    with limiter["lock"]:
+        now = time.monotonic()
+        limiter["token"] = min(
+            limiter["burst"], limiter["token"] + (now - limiter["last"]) / limiter["interval"]
+        )
+        limiter["last"] = now
+
+        if limiter["token"] >= 1:
+            wait_sec = 0
+        else:
+            wait_sec = (1 - limiter["token"]) * limiter["interval"]
+
+        # NOTE: 待ち時間の分は前借りしておき，他のスレッドはその後ろに並ばせる
+        limiter["token"] -= 1
+
+    if limiter["jitter"] != 0:
+        wait_sec += limiter["interval"] * limiter["jitter"] * random.random()
+
+    if wait_sec > 0:
+        logging.debug("Wait {sec:.2f} sec for rate limit".format(sec=wait_sec))
+        time.sleep(wait_sec)
+
+    return wait_sec
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import logger
+
+    args = docopt(__doc__)
+
+    logger.init("test", level=logging.DEBUG)
+
+    limiter = create(float(args["-r"]), int(args["-b"]), float(args["-j"]))
+
+    for i in range(int(args["-n"])):
+        acquire(limiter)
+        logging.info("Request {i}".format(i=i))
@@ -3,6 +3,7 @@
 
 import datetime
 import inspect
+import json
 import logging
 import os
 import random
@@ -21,10 +22,11 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 
 WAIT_RETRY_COUNT = 1
+CACHE_CLEARED_MARKER = ".cache_cleared"
 AGENT_NAME = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
 
 
-def create_driver_impl(profile_name, data_path, agent_name, is_headless):
+def create_driver_impl(profile_name, data_path, agent_name, is_headless, is_perf_log):
     chrome_data_path = data_path / "chrome"
     log_path = data_path / "log"
 
@@ -50,6 +52,10 @@ def create_driver_impl(profile_name, data_path, agent_name, is_headless):
 
     options.add_argument("user-agent={agent_name}".format(agent_name=agent_name))
 
+    if is_perf_log:
+        # NOTE: 通信量の集計に使う
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
     driver = webdriver.Chrome(
         service=Service(
             log_path=str(log_path / "webdriver.log"),
@@ -87,12 +93,12 @@ def create_driver_impl(profile_name, data_path, agent_name, is_headless):
     return driver
 
 
-def create_driver(profile_name, data_path, agent_name=AGENT_NAME, is_headless=True):
+def create_driver(profile_name, data_path, agent_name=AGENT_NAME, is_headless=True, is_perf_log=False):
     # NOTE: 1回だけ自動リトライ
     try:
-        return create_driver_impl(profile_name, data_path, agent_name, is_headless)
+        return create_driver_impl(profile_name, data_path, agent_name, is_headless, is_perf_log)
     except:
-        return create_driver_impl(profile_name, data_path, agent_name, is_headless)
+        return create_driver_impl(profile_name, data_path, agent_name, is_headless, is_perf_log)
 
 
 def xpath_exists(driver, xpath):
@@ -180,10 +186,84 @@ def dump_page(driver, index, dump_path):
     )
 
 
+def set_blocked_url(driver, url_pattern_list):
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": url_pattern_list})
+
+
+def get_network_stat(driver):
+    stat = {"request": 0, "byte": 0, "blocked": 0}
+
+    # NOTE: 前回の呼び出し以降のログだけが返ってくる
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+
+        if message["method"] == "Network.loadingFinished":
+            stat["request"] += 1
+            stat["byte"] += int(message["params"]["encodedDataLength"])
+        elif (message["method"] == "Network.loadingFailed") and (
+            message["params"].get("blockedReason", None) == "inspector"
+        ):
+            stat["blocked"] += 1
+
+    return stat
+
+
+def get_cookie_list(driver):
+    return driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+
+
+def set_cookie_list(driver, cookie_list):
+    COOKIE_PARAM_KEY_LIST = ["name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires"]
+
+    param_list = []
+    for cookie in cookie_list:
+        param = {key: cookie[key] for key in COOKIE_PARAM_KEY_LIST if key in cookie}
+        # NOTE: セッションクッキーは有効期限を指定しない
+        if param.get("expires", -1) < 0:
+            param.pop("expires", None)
+        param_list.append(param)
+
+    driver.execute_cdp_cmd("Network.setCookies", {"cookies": param_list})
+
+
 def clear_cache(driver):
     driver.execute_cdp_cmd("Network.clearBrowserCache", {})
 
 
+def get_profile_path(profile_name, data_path):
+    return data_path / "chrome" / profile_name
+
+
+def get_cache_size(profile_name, data_path):
+    size = 0
+    for cache_dir_name in ["Cache", "Code Cache"]:
+        cache_path = get_profile_path(profile_name, data_path) / "Default" / cache_dir_name
+        if not cache_path.exists():
+            continue
+
+        for path in cache_path.rglob("*"):
+            if path.is_file():
+                size += path.stat().st_size
+
+    return size
+
+
+def get_cache_cleared_time(profile_name, data_path):
+    marker_path = get_profile_path(profile_name, data_path) / CACHE_CLEARED_MARKER
+
+    if not marker_path.exists():
+        return None
+
+    return datetime.datetime.fromtimestamp(marker_path.stat().st_mtime)
+
+
+def mark_cache_cleared(profile_name, data_path):
+    marker_path = get_profile_path(profile_name, data_path) / CACHE_CLEARED_MARKER
+    marker_path.parent.mkdir(parents=True, exist_ok=True)
+    marker_path.touch()
+
+
 def clean_dump(dump_path, keep_days=1):
     if not dump_path.exists():
         return
@@ -238,21 +318,46 @@ def warmup(driver, keyword, url_pattern):
     time.sleep(3)
 
 
+def open_window(driver):
+    current_window = driver.current_window_handle
+
+    driver.switch_to.new_window("tab")
+    window = driver.current_window_handle
+
+    driver.switch_to.window(current_window)
+
+    return window
+
+
 class browser_tab:
     def __init__(self, driver, url):
         self.driver = driver
         self.url = url
 
     def __enter__(self):
+        self.prev_window = self.driver.current_window_handle
         self.driver.execute_script("window.open('{url}', '_blank');".format(url=self.url))
         self.driver.switch_to.window(self.driver.window_handles[-1])
         time.sleep(0.1)
 
     def __exit__(self, exception_type, exception_value, traceback):
         self.driver.close()
-        self.driver.switch_to.window(self.driver.window_handles[-1])
+        self.driver.switch_to.window(self.prev_window)
         time.sleep(0.1)
 
 
+class browser_window:
+    def __init__(self, driver, window):
+        self.driver = driver
+        self.window = window
+
+    def __enter__(self):
+        self.prev_window = self.driver.current_window_handle
+        self.driver.switch_to.window(self.window)
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.driver.switch_to.window(self.prev_window)
+
+
 if __name__ == "__main__":
     clean_dump()
@@ -7,22 +7,258 @@ Usage:
   serializer.py
 """
 
+import gc
+import json
 import logging
 import pathlib
 import pickle
+import struct
 import tempfile
+import threading
 import traceback
 import shutil
 import os
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-def store(file_path_str, data):
+# NOTE: ファイルの先頭に置くヘッダ．旧形式 (pickle そのまま) のファイルと区別するのにも使う
+MAGIC = b"LLSER"
+# NOTE: バージョン 2 で，セクションごとの独自の変換 (codec_map) に対応
+FORMAT_VERSION = 2
+HEADER_FORMAT = ">5sBBI"
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZSTD = 1
+
+COMPRESSION_NAME = {"none": COMPRESSION_NONE, "zstd": COMPRESSION_ZSTD}
+
+
+class LazyDict(dict):
+    # NOTE: 大きなセクションは，最初に参照されるまで復元しない．ファイルの内容は読み込み済みで，
+    # 遅らせるのは pickle の復元だけ．dict の操作は全て遅延中のキーも含めて扱う
+    def __init__(self, data, version=0):
+        super().__init__(data)
+        self.version = version
+        self.lazy = {}
+        self.raw = {}
+        self.lock = threading.RLock()
+
+    def __missing__(self, key):
+        with self.lock:
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+            if key not in self.lazy:
+                raise KeyError(key)
+
+            value = self.lazy.pop(key)()
+            self.raw.pop(key, None)
+            dict.__setitem__(self, key, value)
+
+            return value
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (key in self.lazy)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.lazy.pop(key, None)
+            self.raw.pop(key, None)
+            dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        with self.lock:
+            if (key not in self.lazy) and (not dict.__contains__(self, key)):
+                raise KeyError(key)
+
+            self.lazy.pop(key, None)
+            self.raw.pop(key, None)
+            if dict.__contains__(self, key):
+                dict.__delitem__(self, key)
+
+    def __reversed__(self):
+        return reversed(self.keys())
+
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        return not (self == other)
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        return self.copy() | dict(other.items())
+
+    def __ror__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(other.items()) | self.copy()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def __reduce_ex__(self, protocol):
+        return (LazyDict, (self.copy(), self.version))
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self[key] if key in self else default
+
+    def pop(self, key, *default):
+        with self.lock:
+            if key in self:
+                value = self[key]
+                del self[key]
+                return value
+            if len(default) != 0:
+                return default[0]
+            raise KeyError(key)
+
+    def popitem(self):
+        with self.lock:
+            key_list = self.keys()
+            if len(key_list) == 0:
+                raise KeyError("popitem(): dictionary is empty")
+
+            return (key_list[-1], self.pop(key_list[-1]))
+
+    def setdefault(self, key, default=None):
+        with self.lock:
+            if key not in self:
+                self[key] = default
+            return self[key]
+
+    def update(self, *args, **kwargs):
+        with self.lock:
+            for key, value in dict(*args, **kwargs).items():
+                self[key] = value
+
+    def clear(self):
+        with self.lock:
+            self.lazy.clear()
+            self.raw.clear()
+            dict.clear(self)
+
+    def keys(self):
+        return list(dict.keys(self)) + [key for key in self.lazy.keys() if not dict.__contains__(self, key)]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def copy(self):
+        return dict(self.items())
+
+
+def set_lazy(data, key, func):
+    with data.lock:
+        dict.pop(data, key, None)
+        data.raw.pop(key, None)
+        data.lazy[key] = func
+
+
+def transform(data, key, func):
+    # NOTE: 遅延読み込みのセクションは，読み込んだ時に変換する
+    with data.lock:
+        if key in data.lazy:
+            load_func = data.lazy[key]
+            set_lazy(data, key, lambda: func(load_func()))
+        else:
+            data[key] = func(data[key])
+
+
+def get_version(data):
+    return data.version if isinstance(data, LazyDict) else 0
+
+
+def compress(buf, compression):
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor().compress(buf)
+    else:
+        return buf
+
+
+def decompress(buf, compression):
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdDecompressor().decompress(buf)
+    else:
+        return buf
+
+
+def get_compression(compression_name):
+    compression = COMPRESSION_NAME[compression_name]
+
+    if (compression == COMPRESSION_ZSTD) and (zstandard is None):
+        logging.warning("zstandard is not installed, store without compression")
+        return COMPRESSION_NONE
+
+    return compression
+
+
+def encode_section(data, key, compression, codec_map):
+    is_encoded = key in codec_map
+
+    # NOTE: 一度も参照していないセクションは，復元せずにそのまま書き戻す
+    if (
+        isinstance(data, LazyDict)
+        and (key in data.lazy)
+        and (key in data.raw)
+        and (data.raw[key][1:] == (compression, is_encoded))
+    ):
+        return (data.raw[key][0], is_encoded)
+
+    value = codec_map[key][0](data[key]) if is_encoded else data[key]
+
+    return (compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), compression), is_encoded)
+
+
+def dump(f, data, version, compression, exclude_key_list, codec_map):
+    section_list = []
+    buf_list = []
+    offset = 0
+    for key in data.keys():
+        if key in exclude_key_list:
+            continue
+
+        buf, is_encoded = encode_section(data, key, compression, codec_map)
+        section_list.append([key, offset, len(buf), is_encoded])
+        buf_list.append(buf)
+        offset += len(buf)
+
+    index = json.dumps({"version": version, "section": section_list}).encode("utf-8")
+
+    f.write(struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION, compression, len(index)))
+    f.write(index)
+    for buf in buf_list:
+        f.write(buf)
+
+
+def store(file_path_str, data, version=0, compression_name="none", exclude_key_list=[], codec_map={}):
     logging.debug("Store {file_path}".format(file_path=file_path_str))
 
     file_path = pathlib.Path(file_path_str)
     try:
         f = tempfile.NamedTemporaryFile(dir=str(file_path.parent), delete=False)
-        pickle.dump(data, f)
+        dump(f, data, version, get_compression(compression_name), exclude_key_list, codec_map)
         f.close()
 
         if file_path.exists():
@@ -30,24 +266,189 @@ def store(file_path_str, data):
             shutil.copy(file_path, old_path)
 
         os.replace(f.name, file_path)
+
+        return True
     except:
         logging.error(traceback.format_exc())
+        return False
+
+
+def decode_section(buf, compression, decode_func):
+    # NOTE: 大量のオブジェクトを一度に作るので，その間はガベージコレクションを止める
+    is_gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        value = pickle.loads(decompress(buf, compression))
+
+        return value if decode_func is None else decode_func(value)
+    finally:
+        if is_gc_enabled:
+            gc.enable()
 
 
-def load(file_path, init_value={}):
+def gen_section_loader(buf, compression, decode_func):
+    return lambda: decode_section(buf, compression, decode_func)
+
+
+def parse(f, init_value, lazy_key_list, codec_map):
+    magic, format_version, compression, index_size = struct.unpack(
+        HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT))
+    )
+    if format_version > FORMAT_VERSION:
+        raise ValueError("Unsupported format version: {version}".format(version=format_version))
+
+    index = json.loads(f.read(index_size).decode("utf-8"))
+    body = f.read()
+
+    data = LazyDict(init_value, index["version"])
+    for section in index["section"]:
+        # NOTE: バージョン 1 の索引には，変換の有無が含まれていない
+        key, offset, size = section[:3]
+        is_encoded = section[3] if len(section) > 3 else False
+
+        buf = body[offset : offset + size]
+        if (compression == COMPRESSION_ZSTD) and (zstandard is None):
+            raise RuntimeError("zstandard is required to load {key}".format(key=key))
+        if is_encoded and (key not in codec_map):
+            raise RuntimeError("Decoder is required to load {key}".format(key=key))
+
+        decode_func = codec_map[key][1] if is_encoded else None
+        if key in lazy_key_list:
+            set_lazy(data, key, gen_section_loader(buf, compression, decode_func))
+            data.raw[key] = (buf, compression, is_encoded)
+        else:
+            dict.__setitem__(data, key, decode_section(buf, compression, decode_func))
+
+    return data
+
+
+def load(file_path, init_value={}, lazy_key_list=[], codec_map={}):
     logging.debug("Load {file_path}".format(file_path=file_path))
 
     if not file_path.exists():
-        return init_value
+        return LazyDict(init_value.copy())
 
     try:
         with open(file_path, "rb") as f:
-            data = init_value.copy()
+            if f.read(len(MAGIC)) == MAGIC:
+                f.seek(0)
+                return parse(f, init_value, lazy_key_list, codec_map)
+
+            # NOTE: 旧形式のファイルは全体を pickle で保存している
+            f.seek(0)
+            data = LazyDict(init_value)
             data.update(pickle.load(f))
             return data
     except:
         logging.error(traceback.format_exc())
-        return init_value
+        return LazyDict(init_value.copy())
+
+
+def append(file_path_str, record_list):
+    logging.debug(
+        "Append {count} records to {file_path}".format(count=len(record_list), file_path=file_path_str)
+    )
+
+    with open(file_path_str, "ab") as f:
+        for record in record_list:
+            pickle.dump(record, f)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def load_journal(file_path):
+    logging.debug("Load journal {file_path}".format(file_path=file_path))
+
+    record_list = []
+
+    if not file_path.exists():
+        return record_list
+
+    with open(file_path, "rb") as f:
+        valid_size = 0
+        while True:
+            try:
+                record_list.append(pickle.load(f))
+                valid_size = f.tell()
+            except:
+                # NOTE: 途中で切れたレコードは EOFError になることもあるので，末尾かどうかはサイズで判断する
+                break
+
+        file_size = os.fstat(f.fileno()).st_size
+
+    if file_size > valid_size:
+        # NOTE: 書き込み途中で中断した末尾のレコードは捨て，以降の追記ができるようにする
+        logging.warning(
+            "Broken journal record is found, truncate {file_path} to {size:,} bytes".format(
+                file_path=file_path, size=valid_size
+            )
+        )
+        os.truncate(file_path, valid_size)
+
+    return record_list
+
+
+def truncate(file_path):
+    with open(file_path, "wb") as f:
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def benchmark(data, lazy_key_list=[], codec_map={}, repeat=3):
+    import time
+
+    def measure(func):
+        time_list = []
+        for i in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            func()
+            time_list.append(time.perf_counter() - start)
+
+        return min(time_list)
+
+    # NOTE: 遅延読み込みしないセクションだけを参照した場合の時間も測る
+    eager_key = next(key for key in data.keys() if key not in lazy_key_list)
+
+    with tempfile.TemporaryDirectory() as dir_path:
+        file_path = pathlib.Path(dir_path, "bench.dat")
+
+        def store_pickle():
+            with open(file_path, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        def load_pickle():
+            with open(file_path, "rb") as f:
+                pickle.load(f)
+
+        result = [
+            ("pickle", measure(store_pickle), measure(load_pickle), None, file_path.stat().st_size),
+        ]
+
+        for compression_name in ["none", "zstd"] if zstandard is not None else ["none"]:
+            store_time = measure(
+                lambda: store(file_path, data, compression_name=compression_name, codec_map=codec_map)
+            )
+            load_time = measure(
+                lambda: [value for value in load(file_path, {}, lazy_key_list, codec_map).values()]
+            )
+            lazy_time = measure(lambda: load(file_path, {}, lazy_key_list, codec_map)[eager_key])
+            result.append((compression_name, store_time, load_time, lazy_time, file_path.stat().st_size))
+
+    for name, store_time, load_time, lazy_time, size in result:
+        logging.info(
+            "[{name:6s}] store: {store:7.3f}s, load: {load:7.3f}s, "
+            "load without lazy sections: {lazy}, size: {size:,.1f} KB".format(
+                name=name,
+                store=store_time,
+                load=load_time,
+                lazy="   -    " if lazy_time is None else "{lazy:7.3f}s".format(lazy=lazy_time),
+                size=size / 1024,
+            )
+        )
+
+    return result
 
 
 if __name__ == "__main__":
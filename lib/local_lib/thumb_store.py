@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+サムネイル画像を，1つのデータファイルにまとめて保存します．
+内容が同じ画像は，キーが異なっていても1つだけ保存します．
+
+Usage:
+  thumb_store.py -s STORE [-m DIR]
+
+Options:
+  -s STORE      : サムネイルを保存するフォルダを指定します．
+  -m DIR        : 指定したフォルダにある画像ファイルを取り込みます．
+"""
+
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import pathlib
+import threading
+import traceback
+
+DATA_FILE_NAME = "thumb.pack"
+INDEX_FILE_NAME = "thumb.jsonl"
+INFO_FILE_NAME = "thumb_info.jsonl"
+
+
+def load_index(store_path):
+    index = {}
+
+    index_path = store_path / INDEX_FILE_NAME
+    data_path = store_path / DATA_FILE_NAME
+    if not index_path.exists() or not data_path.exists():
+        return index
+
+    data_size = data_path.stat().st_size
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except:
+                # NOTE: 書き込み途中で中断した行は無視する
+                logging.warning("Broken thumbnail index entry is ignored")
+                continue
+
+            if entry["offset"] + entry["size"] > data_size:
+                logging.warning("Truncated thumbnail is ignored: {key}".format(key=entry["key"]))
+                continue
+
+            # NOTE: 同じ画像は後に保存したものを優先する
+            index[entry["key"]] = entry
+
+    return index
+
+
+def load_info(store_path):
+    info_map = {}
+
+    info_path = store_path / INFO_FILE_NAME
+    if not info_path.exists():
+        return info_map
+
+    with open(info_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except:
+                # NOTE: 書き込み途中で中断した行は無視する
+                logging.warning("Broken thumbnail info entry is ignored")
+                continue
+
+            info_map[entry["hash"]] = entry["info"]
+
+    return info_map
+
+
+def build_blob_map(index):
+    blob_map = {}
+    for entry in index.values():
+        if "hash" in entry:
+            blob_map[entry["hash"]] = entry
+
+    return blob_map
+
+
+def create(store_path):
+    store_path = pathlib.Path(store_path)
+    store_path.mkdir(parents=True, exist_ok=True)
+
+    index = load_index(store_path)
+
+    return {
+        "path": store_path,
+        "index": index,
+        "blob": build_blob_map(index),
+        "info": load_info(store_path),
+        "lock": threading.Lock(),
+        "map": None,
+    }
+
+
+def put(store, key, data):
+    digest = hashlib.sha256(data).hexdigest()
+
+    with store["lock"]:
+        blob = store["blob"].get(digest, None)
+
+        if blob is None:
+            with open(store["path"] / DATA_FILE_NAME, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            # NOTE: 同じ内容の画像が保存済みの場合は，それを参照するだけにする
+            offset = blob["offset"]
+
+        # NOTE: データを書き終えてから索引に追記するので，中断しても不整合にならない
+        entry = {"key": key, "hash": digest, "offset": offset, "size": len(data)}
+        with open(store["path"] / INDEX_FILE_NAME, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        store["index"][key] = entry
+        store["blob"][digest] = entry
+
+    return digest
+
+
+def exists(store, key):
+    return key in store["index"]
+
+
+def get_map(store, size):
+    # NOTE: 追記されてマップ済みの範囲を超えた場合は，マップし直す
+    if (store["map"] is None) or (len(store["map"]) < size):
+        if store["map"] is not None:
+            store["map"].close()
+
+        with open(store["path"] / DATA_FILE_NAME, "rb") as f:
+            store["map"] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return store["map"]
+
+
+def get(store, key):
+    with store["lock"]:
+        entry = store["index"].get(key, None)
+        if entry is None:
+            return None
+
+        data_map = get_map(store, entry["offset"] + entry["size"])
+
+        return data_map[entry["offset"] : entry["offset"] + entry["size"]]
+
+
+def get_hash(store, key):
+    entry = store["index"].get(key, None)
+    if entry is None:
+        return None
+
+    if "hash" not in entry:
+        digest = hashlib.sha256(get(store, key)).hexdigest()
+
+        # NOTE: ハッシュ値を持たない以前の画像も，同じ内容の画像を保存する際に参照できるようにする
+        with store["lock"]:
+            entry["hash"] = digest
+            store["blob"].setdefault(digest, entry)
+
+    return entry["hash"]
+
+
+def get_info(store, key):
+    digest = get_hash(store, key)
+
+    return None if digest is None else store["info"].get(digest, None)
+
+
+def set_info(store, key, info):
+    # NOTE: 画像の大きさ等は内容から決まるので，ハッシュ値に対して記録する
+    digest = get_hash(store, key)
+    if digest is None:
+        return
+
+    with store["lock"]:
+        with open(store["path"] / INFO_FILE_NAME, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"hash": digest, "info": info}) + "\n")
+
+        store["info"][digest] = info
+
+
+def open_image(store, key):
+    data = get(store, key)
+
+    return None if data is None else io.BytesIO(data)
+
+
+def migrate(store, dir_path, pattern="*.png"):
+    count = 0
+    for file_path in sorted(pathlib.Path(dir_path).glob(pattern)):
+        try:
+            if not exists(store, file_path.stem):
+                put(store, file_path.stem, file_path.read_bytes())
+                count += 1
+
+            # NOTE: 取り込んだ画像ファイルは不要になるので削除する
+            file_path.unlink()
+        except:
+            logging.error(traceback.format_exc())
+
+    if count != 0:
+        logging.info("Migrate {count:,} thumbnails into {path}".format(count=count, path=store["path"]))
+
+    return count
+
+
+def close(store):
+    with store["lock"]:
+        if store["map"] is not None:
+            store["map"].close()
+            store["map"] = None
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import logger
+
+    args = docopt(__doc__)
+
+    logger.init("test", level=logging.INFO)
+
+    store = create(args["-s"])
+
+    if args["-m"] is not None:
+        migrate(store, args["-m"])
+
+    logging.info(
+        "{count:,} thumbnails ({blob:,} distinct), {size:,.1f} MB".format(
+            count=len(store["index"]),
+            blob=len(store["blob"]),
+            size=(store["path"] / DATA_FILE_NAME).stat().st_size / (1024 * 1024),
+        )
+    )
+
+    close(store)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+openpyxl で作成した Excel ファイルに，別に作成した行と画像を追記します．
+
+Usage:
+  xlsx_append.py -i BASE -a PART -r ROW [-o OUTPUT]
+
+Options:
+  -i BASE       : 追記先の Excel ファイルを指定します．
+  -a PART       : 追記する行を含む Excel ファイルを指定します．
+  -r ROW        : ヘッダの行番号を指定します．追記する行はこれより後のものになります．
+  -o OUTPUT     : 出力する Excel ファイルを指定します．省略時は BASE を上書きします．
+"""
+
+import io
+import logging
+import os
+import pathlib
+import re
+import tempfile
+import traceback
+import zipfile
+
+SHEET_PART = "xl/worksheets/sheet1.xml"
+SHEET_RELS_PART = "xl/worksheets/_rels/sheet1.xml.rels"
+DRAWING_PART = "xl/drawings/drawing1.xml"
+DRAWING_RELS_PART = "xl/drawings/_rels/drawing1.xml.rels"
+STYLE_PART = "xl/styles.xml"
+WORKBOOK_PART = "xl/workbook.xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+ROW_PATTERN = re.compile(r'<row r="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.DOTALL)
+HYPERLINK_PATTERN = re.compile(r"<hyperlink [^>]*/>")
+RELATIONSHIP_PATTERN = re.compile(r"<Relationship [^>]*/>")
+ANCHOR_PATTERN = re.compile(r"<twoCellAnchor>.*?</twoCellAnchor>", re.DOTALL)
+REL_ID_PATTERN = re.compile(r'((?:r:id|r:embed|Id)=")rId(\d+)(")')
+PICTURE_ID_PATTERN = re.compile(r'<cNvPr id="(\d+)" name="Image (\d+)"')
+EXTENSION_PATTERN = re.compile(r'<Default Extension="([^"]+)"')
+REF_PATTERN = re.compile(r'(<(?:dimension|autoFilter) ref="[A-Z]+\d+:[A-Z]+)(\d+)(")')
+FILTER_DB_PATTERN = re.compile(r"(_xlnm\._FilterDatabase[^>]*>[^<]*:\$[A-Z]+\$)(\d+)(<)")
+
+
+def max_rel_id(text):
+    return max([int(m.group(2)) for m in REL_ID_PATTERN.finditer(text)], default=0)
+
+
+def shift_rel_id(text, offset):
+    return REL_ID_PATTERN.sub(
+        lambda m: "{head}rId{id}{tail}".format(head=m.group(1), id=int(m.group(2)) + offset, tail=m.group(3)),
+        text,
+    )
+
+
+def shift_picture_id(text, offset):
+    return PICTURE_ID_PATTERN.sub(
+        lambda m: '<cNvPr id="{id}" name="Image {id}"'.format(id=int(m.group(1)) + offset), text
+    )
+
+
+def insert_before(text, mark, fragment):
+    pos = text.rindex(mark)
+
+    return text[:pos] + fragment + text[pos:]
+
+
+def set_row_last(text, pattern, row_last):
+    return pattern.sub(
+        lambda m: "{head}{row}{tail}".format(head=m.group(1), row=row_last, tail=m.group(3)), text
+    )
+
+
+def is_appendable(base_part, add_part):
+    # NOTE: スタイルの番号がずれていると書式が崩れるので，同じ内容の場合だけ追記する
+    if base_part[STYLE_PART] != add_part[STYLE_PART]:
+        logging.info("Styles are changed")
+        return False
+
+    if not set(EXTENSION_PATTERN.findall(add_part[CONTENT_TYPES_PART])).issubset(
+        EXTENSION_PATTERN.findall(base_part[CONTENT_TYPES_PART])
+    ):
+        logging.info("New image format is found")
+        return False
+
+    for name in [SHEET_RELS_PART, DRAWING_PART, DRAWING_RELS_PART]:
+        if (name in add_part) and (name not in base_part):
+            logging.info("New part is needed: {name}".format(name=name))
+            return False
+
+    if (SHEET_RELS_PART in add_part) and ("</hyperlinks>" not in base_part[SHEET_PART]):
+        logging.info("Hyperlinks are not found")
+        return False
+
+    return True
+
+
+def read_part(archive):
+    part = {}
+    for name in [
+        SHEET_PART,
+        SHEET_RELS_PART,
+        DRAWING_PART,
+        DRAWING_RELS_PART,
+        STYLE_PART,
+        CONTENT_TYPES_PART,
+    ]:
+        if name in archive.namelist():
+            part[name] = archive.read(name).decode("utf-8")
+
+    return part
+
+
+def merge_part(base_part, add_part, header_row):
+    part = {}
+
+    row_list = [
+        m.group(0) for m in ROW_PATTERN.finditer(add_part[SHEET_PART]) if int(m.group(1)) > header_row
+    ]
+    if len(row_list) == 0:
+        return part
+
+    row_last = max(int(ROW_PATTERN.match(row).group(1)) for row in row_list)
+
+    sheet = insert_before(base_part[SHEET_PART], "</sheetData>", "".join(row_list))
+    sheet = set_row_last(sheet, REF_PATTERN, row_last)
+
+    if SHEET_RELS_PART in add_part:
+        # NOTE: 追記するハイパーリンクの ID は，既存のものと重ならないようにずらす
+        rel_offset = max_rel_id(base_part[SHEET_RELS_PART])
+        hyperlink_list = HYPERLINK_PATTERN.findall(add_part[SHEET_PART])
+        rel_list = [
+            rel for rel in RELATIONSHIP_PATTERN.findall(add_part[SHEET_RELS_PART]) if "/hyperlink" in rel
+        ]
+
+        sheet = insert_before(sheet, "</hyperlinks>", shift_rel_id("".join(hyperlink_list), rel_offset))
+        part[SHEET_RELS_PART] = insert_before(
+            base_part[SHEET_RELS_PART], "</Relationships>", shift_rel_id("".join(rel_list), rel_offset)
+        )
+
+    if DRAWING_PART in add_part:
+        rel_offset = max_rel_id(base_part[DRAWING_RELS_PART])
+        picture_offset = max(
+            [int(id) for id, _ in PICTURE_ID_PATTERN.findall(base_part[DRAWING_PART])], default=0
+        )
+        anchor_list = ANCHOR_PATTERN.findall(add_part[DRAWING_PART])
+        rel_list = RELATIONSHIP_PATTERN.findall(add_part[DRAWING_RELS_PART])
+
+        part[DRAWING_PART] = insert_before(
+            base_part[DRAWING_PART],
+            "</wsDr>",
+            shift_picture_id(shift_rel_id("".join(anchor_list), rel_offset), picture_offset),
+        )
+        part[DRAWING_RELS_PART] = insert_before(
+            base_part[DRAWING_RELS_PART], "</Relationships>", shift_rel_id("".join(rel_list), rel_offset)
+        )
+
+    part[SHEET_PART] = sheet
+    part["row_last"] = row_last
+
+    return part
+
+
+def append(base_path, add_data, header_row, output_path=None):
+    base_path = pathlib.Path(base_path)
+    output_path = base_path if output_path is None else pathlib.Path(output_path)
+
+    temp_path = None
+    try:
+        with zipfile.ZipFile(base_path) as base, zipfile.ZipFile(io.BytesIO(add_data)) as add:
+            base_part = read_part(base)
+            add_part = read_part(add)
+
+            if not is_appendable(base_part, add_part):
+                return False
+
+            part = merge_part(base_part, add_part, header_row)
+            row_last = part.pop("row_last", None)
+            if row_last is None:
+                return True
+
+            workbook = set_row_last(base.read(WORKBOOK_PART).decode("utf-8"), FILTER_DB_PATTERN, row_last)
+            part[WORKBOOK_PART] = workbook
+
+            f = tempfile.NamedTemporaryFile(dir=str(output_path.parent), suffix=".xlsx", delete=False)
+            temp_path = pathlib.Path(f.name)
+            with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+                for name in base.namelist():
+                    if name in part:
+                        archive.writestr(name, part[name].encode("utf-8"))
+                    else:
+                        archive.writestr(name, base.read(name))
+
+                # NOTE: 画像は内容ごとに1つなので，まだ含まれていないものだけ追加する
+                base_name_set = set(base.namelist())
+                for name in add.namelist():
+                    if name.startswith("xl/media/") and (name not in base_name_set):
+                        archive.writestr(name, add.read(name))
+            f.close()
+
+        os.replace(temp_path, output_path)
+
+        return True
+    except:
+        logging.error(traceback.format_exc())
+        return False
+    finally:
+        # NOTE: 途中で失敗した場合は，書きかけのファイルを残さない
+        if (temp_path is not None) and temp_path.exists():
+            f.close()
+            temp_path.unlink()
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import logger
+
+    args = docopt(__doc__)
+
+    logger.init("test", level=logging.INFO)
+
+    if append(args["-i"], pathlib.Path(args["-a"]).read_bytes(), int(args["-r"]), args["-o"]):
+        logging.info("Complete")
+    else:
+        logging.warning("Unable to append")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+カテゴリが未取得の商品について，商品ページを巡回してカテゴリを補完します．
+
+Usage:
+  category.py [-c CONFIG]
+
+Options:
+  -c CONFIG     : CONFIG を設定ファイルとして読み込んで実行します．[default: config.yaml]
+"""
+
+import logging
+import traceback
+
+import store_yodobashi.crawler
+import store_yodobashi.handle
+
+import local_lib.selenium_util
+
+STATUS_CATEGORY = "[enrich] Category"
+
+BATCH_SIZE = 20
+
+
+def fetch_category(handle, item):
+    driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
+
+    with local_lib.selenium_util.browser_window(driver, store_yodobashi.handle.get_work_window(handle)):
+        store_yodobashi.crawler.visit_url(handle, item["url"])
+        store_yodobashi.crawler.fetch_item_detail(handle, item)
+
+    return item["category"]
+
+
+def fetch_category_batch(handle, item_list):
+    category_map = {}
+    for item in item_list:
+        category = store_yodobashi.handle.get_cached_category(handle, item["id"])
+
+        if category is None:
+            try:
+                category = fetch_category(handle, item.copy())
+            except:
+                # NOTE: 1商品の失敗で全体を止めず，未取得のまま次回に回す
+                logging.warning("Failed to fetch category: {name}".format(name=item["name"]))
+                logging.debug(traceback.format_exc())
+
+                store_yodobashi.handle.get_progress_bar(handle, STATUS_CATEGORY).update()
+                continue
+
+        logging.info("{name}: {category}".format(name=item["name"], category=" > ".join(category)))
+        category_map[item["id"]] = category
+
+        store_yodobashi.handle.get_progress_bar(handle, STATUS_CATEGORY).update()
+
+    store_yodobashi.handle.set_item_category(handle, category_map)
+    store_yodobashi.handle.store_order_info(handle)
+
+    return len(category_map)
+
+
+def fetch_pending_category(handle):
+    # NOTE: 同じ商品を何度も購入していても，商品ページは1回だけ訪れる
+    item_list = list(store_yodobashi.handle.get_pending_category_item_map(handle).values())
+
+    logging.info("Pending category: {count:,} items".format(count=len(item_list)))
+
+    if len(item_list) == 0:
+        return
+
+    store_yodobashi.handle.set_status(handle, "商品のカテゴリを補完しています...")
+    store_yodobashi.handle.set_progress_bar(handle, STATUS_CATEGORY, len(item_list))
+
+    done_count = 0
+    for i in range(0, len(item_list), BATCH_SIZE):
+        done_count += fetch_category_batch(handle, item_list[i : i + BATCH_SIZE])
+
+    store_yodobashi.handle.get_progress_bar(handle, STATUS_CATEGORY).update()
+
+    logging.info(
+        "Complete category: {done:,} / {total:,} items".format(done=done_count, total=len(item_list))
+    )
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import local_lib.logger
+    import local_lib.config
+
+    args = docopt(__doc__)
+
+    local_lib.logger.init("test", level=logging.INFO)
+
+    config = local_lib.config.load(args["-c"])
+    handle = store_yodobashi.handle.create(config)
+
+    try:
+        fetch_pending_category(handle)
+    except:
+        store_yodobashi.handle.set_status(handle, "エラーが発生しました", is_error=True)
+        logging.error(traceback.format_exc())
+
+    store_yodobashi.handle.finish(handle)
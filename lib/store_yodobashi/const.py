@@ -6,3 +6,32 @@ HIST_URL = "https://order.yodobashi.com/yc/orderhistory/index.html"
 ORDER_URL_BY_NO = "https://order.yodobashi.com/yc/orderhistory/index.html?orderNo={no}"
 
 ORDER_COUNT_PER_PAGE = 20
+
+LOGIN_URL_PATTERN = "*/yc/login/*"
+
+COOKIE_DOMAIN = "yodobashi.com"
+
+# NOTE: 解析に不要なリソース (フォント，画像，広告，アクセス解析)
+BLOCK_URL_PATTERN = [
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.jpg",
+    "*.jpeg",
+    "*.png",
+    "*.gif",
+    "*.webp",
+    "*.svg",
+    "*.mp4",
+    "*googletagmanager.com*",
+    "*google-analytics.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*criteo.*",
+]
+
+# NOTE: リソースをブロックしないページ (ログイン画面では画像認証が必要になることがある)
+BLOCK_ALLOW_PAGE_PATTERN = [
+    LOGIN_URL_PATTERN,
+]
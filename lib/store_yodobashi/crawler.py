@@ -13,50 +13,87 @@ Options:
   -n ORDER_NO   : 注文番号．
 """
 
+import concurrent.futures
+import fnmatch
 import logging
+import queue
 import random
 import math
-import re
 import datetime
-import time
 import traceback
 
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.action_chains import ActionChains
 
 import store_yodobashi.const
 import store_yodobashi.handle
+import store_yodobashi.order_history
+import store_yodobashi.parser
+import store_yodobashi.thumbnail
 
 import local_lib.captcha
+import local_lib.page_archive
+import local_lib.rate_limiter
 import local_lib.selenium_util
 
 STATUS_ORDER_COUNT = "[collect] Count of year"
 STATUS_ORDER_ITEM_ALL = "[collect] All orders"
 STATUS_ORDER_ITEM_BY_YEAR = "[collect] Year {year} orders"
+STATUS_ORDER_ITEM_BY_WORKER = "[collect] Worker {index} orders"
+STATUS_ORDER_ITEM_NEW = "[collect] New orders"
+
+ORDER_READY_XPATH = '//div[contains(@class, "ecOderStatus")]//li/strong[contains(text(), "注文番号")]'
+LOGIN_XPATH = '//div[contains(@class, "ecLogin")]'
+
+PAGE_KIND_ORDER_LIST = "order_list"
+PAGE_KIND_ORDER = "order"
+PAGE_KIND_ITEM = "item"
 
 LOGIN_RETRY_COUNT = 2
 FETCH_RETRY_COUNT = 5
 
 
-def wait_for_loading(handle, xpath="//body", sec=1):
+def wait_for_loading(handle, xpath="//body"):
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
     wait.until(EC.visibility_of_all_elements_located((By.XPATH, xpath)))
-    time.sleep(sec)
+    wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+
+    log_network_stat(handle)
 
 
-def parse_date(date_text):
-    return datetime.datetime.strptime(date_text, "%Y年%m月%d日")
+def log_network_stat(handle):
+    if not store_yodobashi.handle.get_block_config(handle)["enable"]:
+        return
+
+    driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
+    stat = local_lib.selenium_util.get_network_stat(driver)
+    if (stat["request"] == 0) and (stat["blocked"] == 0):
+        return
 
-def gen_item_id_from_url(url):
-    return re.match(r"https://www.yodobashi.com/product-detail/([^/]+)/", url).group(1)
+    logging.info(
+        "Network: {request:,} requests ({kbyte:,.1f} KB) loaded, {blocked:,} requests blocked".format(
+            request=stat["request"], kbyte=stat["byte"] / 1024, blocked=stat["blocked"]
+        )
+    )
 
 
-def gen_item_id_from_thumb_url(url):
-    return re.match(r".*/\d+/(\d+)_\d+\.", url).group(1)
+def prepare_visit(handle, url):
+    is_allow = any(
+        map(
+            lambda pattern: fnmatch.fnmatch(url, pattern),
+            store_yodobashi.handle.get_block_config(handle)["allow"],
+        )
+    )
+    store_yodobashi.handle.set_resource_block(handle, not is_allow)
+
+    wait_for_rate_limit(handle)
+
+
+def wait_for_rate_limit(handle):
+    local_lib.rate_limiter.acquire(store_yodobashi.handle.get_rate_limiter(handle))
 
 
 def gen_order_url_from_no(no):
@@ -67,21 +104,50 @@ def gen_status_label_by_year(year):
     return STATUS_ORDER_ITEM_BY_YEAR.format(year=year)
 
 
+def gen_status_label_by_worker(index):
+    return STATUS_ORDER_ITEM_BY_WORKER.format(index=index)
+
+
+def update_order_progress(handle, year, count=1):
+    store_yodobashi.handle.get_progress_bar(handle, gen_status_label_by_year(year)).update(count)
+    store_yodobashi.handle.get_progress_bar(handle, STATUS_ORDER_ITEM_ALL).update(count)
+
+    if "worker" in handle:
+        store_yodobashi.handle.get_progress_bar(handle, gen_status_label_by_worker(handle["worker"])).update(
+            count
+        )
+
+
 def visit_url(handle, url, xpath="//body"):
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
+    store_yodobashi.handle.clear_list_page(handle)
+    prepare_visit(handle, url)
     driver.get(url)
     wait_for_loading(handle, xpath)
 
 
-def save_thumbnail(handle, item, thumb_url):
+def get_page_source(handle, kind, key):
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
-    with local_lib.selenium_util.browser_tab(driver, thumb_url):
-        png_data = driver.find_element(By.XPATH, "//img").screenshot_as_png
+    page_source = driver.page_source
+
+    if store_yodobashi.handle.is_record_mode(handle):
+        local_lib.page_archive.store(
+            store_yodobashi.handle.get_page_archive(handle), kind, key, driver.current_url, page_source
+        )
+
+    return page_source
+
 
-        with open(store_yodobashi.handle.get_thumb_path(handle, item), "wb") as f:
-            f.write(png_data)
+def save_thumbnail(handle, item, thumb_url):
+    store_yodobashi.thumbnail.submit(
+        store_yodobashi.handle.get_thumb_fetcher(handle),
+        thumb_url,
+        store_yodobashi.handle.get_thumb_store(handle),
+        store_yodobashi.handle.get_thumb_key(item),
+        store_yodobashi.order_history.get_thumb_size(),
+    )
 
 
 def fetch_item_detail(handle, item):
@@ -89,81 +155,30 @@ def fetch_item_detail(handle, item):
 
     wait_for_loading(handle)
 
-    if local_lib.selenium_util.xpath_exists(driver, '//div[contains(@class, "notFoundMsg")]'):
+    category = store_yodobashi.parser.parse_item_detail(
+        get_page_source(handle, PAGE_KIND_ITEM, item["id"]), driver.current_url
+    )
+
+    if category is None:
         logging.info("{name}: 商品ページが削除されています".format(name=item["name"]))
         item["category"] = []
         return
 
-    breadcrumb_list = driver.find_elements(
-        By.XPATH,
-        '//ul[@itemtype="http://schema.org/BreadcrumbList"]'
-        + '/li[@itemtype="http://schema.org/ListItem"]/a[@itemprop="item"]',
-    )
-    category = list(map(lambda x: x.text, breadcrumb_list))
-
-    category.pop(0)
-
     item["category"] = category
 
 
-def parse_item(handle, item_xpath):
-    driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
-
-    thumb_url = driver.find_element(
-        By.XPATH,
-        item_xpath + '//td[contains(@class, "ecImgArea")]//img',
-    ).get_attribute("src")
-
-    if local_lib.selenium_util.xpath_exists(
-        driver, item_xpath + '//td[contains(@class, "ecPriceArea")]/preceding-sibling::td/p/a'
-    ):
-        title = driver.find_element(
-            By.XPATH, item_xpath + '//td[contains(@class, "ecPriceArea")]/preceding-sibling::td/p/a'
-        )
-
-        name = title.text.replace("\n", " ")
-        url = title.get_attribute("href")
-        item_id = gen_item_id_from_url(url)
-    else:
-        title = driver.find_element(
-            By.XPATH, item_xpath + '//td[contains(@class, "ecPriceArea")]/preceding-sibling::td/p/strong'
-        )
-        name = title.text.replace("\n", " ")
-        url = None
-        item_id = gen_item_id_from_thumb_url(thumb_url)
-
-    if local_lib.selenium_util.xpath_exists(
-        driver, item_xpath + '//p/strong[contains(@class, "red")]/span[contains(text(), "キャンセル")]'
-    ):
-        return {"name": name, "cancel": True}
-
-    price_text = driver.find_element(By.XPATH, item_xpath + '//td[contains(@class, "ecPriceArea")]/p').text
-    price = int(re.match(r".*?(\d{1,3}(?:,\d{3})*)", price_text).group(1).replace(",", ""))
-
-    count = int(
-        driver.find_element(By.XPATH, item_xpath + '//td[contains(@class, "ecQuantityArea")]/span').text
-    )
-
-    item = {"name": name, "price": price, "count": count, "url": url, "id": item_id}
-
-    save_thumbnail(handle, item, thumb_url)
+def complete_item(handle, item):
+    save_thumbnail(handle, item, item.pop("thumb_url"))
 
     if item["url"] is not None:
-        ActionChains(driver).key_down(Keys.COMMAND).click(title).key_up(Keys.COMMAND).perform()
-        driver.switch_to.window(driver.window_handles[-1])
-        fetch_item_detail(handle, item)
-        driver.close()
-        driver.switch_to.window(driver.window_handles[-1])
+        # NOTE: キャッシュに無いカテゴリは，注文の収集後に store_yodobashi.category でまとめて補完する
+        item["category"] = store_yodobashi.handle.get_cached_category(handle, item["id"])
     else:
         logging.info("{name}: 商品ページが削除されています".format(name=item["name"]))
         item["category"] = []
 
-    return item
-
 
 def parse_order(handle, order_info):
-    ITEM_XPATH = '//div[contains(@class, "orderDetailBlock")]'
-
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
     logging.info(
@@ -173,56 +188,78 @@ def parse_order(handle, order_info):
         )
     )
 
-    date_text = driver.find_element(
-        By.XPATH,
-        '//div[contains(@class, "ecOderStatus")]//li/strong[contains(text(), "注文日")]/..',
-    ).text.split("：")[1]
-    date = parse_date(date_text)
-
-    no = driver.find_element(
-        By.XPATH,
-        '//div[contains(@class, "ecOderStatus")]//li/strong[contains(text(), "注文番号")]/..',
-    ).text.split("：")[1]
-
-    item_base = {"date": date, "no": no}
+    # NOTE: ページのスナップショットを一度だけ取得し，解析はオフラインで行う
+    order = store_yodobashi.parser.parse_order(
+        get_page_source(handle, PAGE_KIND_ORDER, order_info["no"]), driver.current_url
+    )
 
-    is_unempty = False
-    for i in range(len(driver.find_elements(By.XPATH, ITEM_XPATH))):
-        item_xpath = "(" + ITEM_XPATH + ")[{index}]".format(index=i + 1)
+    item_base = {"date": order["date"], "no": order["no"]}
 
-        item = parse_item(handle, item_xpath)
+    item_list = []
+    for item in order["item_list"]:
         item |= item_base
 
         if "cancel" not in item:
+            complete_item(handle, item)
             logging.info("{name} {price:,}円".format(name=item["name"], price=item["price"]))
-            store_yodobashi.handle.record_item(handle, item)
+            item_list.append(item)
         else:
             logging.info("{name}: キャンセルされました".format(name=item["name"]))
 
-        is_unempty = True
+    if len(order["item_list"]) != 0:
+        store_yodobashi.handle.record_order_item_list(handle, order["no"], order["date"], item_list)
 
-    return is_unempty
+    return len(order["item_list"]) != 0
 
 
-def fetch_order_item_list_by_order_info(handle, order_info):
+def visit_order_page_by_form(handle, order_info):
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
-    with local_lib.selenium_util.browser_tab(driver, store_yodobashi.const.HIST_URL):
-        keep_logged_on(handle)
+    visit_url(handle, store_yodobashi.const.HIST_URL)
+    keep_logged_on(handle)
 
-        driver.find_element(By.XPATH, '//input[@id="orderNo"]').send_keys(order_info["no"])
+    driver.find_element(By.XPATH, '//input[@id="orderNo"]').send_keys(order_info["no"])
 
-        driver.find_element(
-            By.XPATH, '//div[contains(@class, "piKwIpt")]//span[contains(@class, "yBtnInner")]/a'
-        ).click()
+    driver.find_element(
+        By.XPATH, '//div[contains(@class, "piKwIpt")]//span[contains(@class, "yBtnInner")]/a'
+    ).click()
+
+    wait.until(EC.presence_of_element_located((By.XPATH, ORDER_READY_XPATH)))
+
+
+def visit_order_page(handle, order_info):
+    driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
+
+    prepare_visit(handle, gen_order_url_from_no(order_info["no"]))
+    driver.get(gen_order_url_from_no(order_info["no"]))
+
+    try:
+        wait.until(EC.presence_of_element_located((By.XPATH, ORDER_READY_XPATH + " | " + LOGIN_XPATH)))
+        log_network_stat(handle)
+
+        if local_lib.selenium_util.xpath_exists(driver, LOGIN_XPATH):
+            keep_logged_on(handle, True)
+            driver.get(gen_order_url_from_no(order_info["no"]))
+            wait.until(EC.presence_of_element_located((By.XPATH, ORDER_READY_XPATH)))
+
+        return
+    except TimeoutException:
+        logging.warning(
+            "Failed to open order page of {no} directly, fallback to search form".format(no=order_info["no"])
+        )
 
-        time.sleep(0.5)
+    visit_order_page_by_form(handle, order_info)
+
+
+def fetch_order_item_list_by_order_info(handle, order_info):
+    driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
+
+    with local_lib.selenium_util.browser_window(driver, store_yodobashi.handle.get_work_window(handle)):
+        visit_order_page(handle, order_info)
 
         if not parse_order(handle, order_info):
             logging.warning("Failed to parse order of {no}".format(no=order_info["no"]))
 
-    time.sleep(5)
-
 
 def skip_order_item_list_by_year_page(handle, year, page):
     logging.info("Skip check order of {year} page {page} [cached]".format(year=year, page=page))
@@ -231,49 +268,37 @@ def skip_order_item_list_by_year_page(handle, year, page):
         - store_yodobashi.handle.get_progress_bar(handle, gen_status_label_by_year(year)).count,
         store_yodobashi.const.ORDER_COUNT_PER_PAGE,
     )
-    store_yodobashi.handle.get_progress_bar(handle, gen_status_label_by_year(year)).update(incr_order)
-    store_yodobashi.handle.get_progress_bar(handle, STATUS_ORDER_ITEM_ALL).update(incr_order)
+    update_order_progress(handle, year, incr_order)
 
-    # NOTE: これ，状況によっては最終ページで成り立たないので，良くない
-    return incr_order != store_yodobashi.const.ORDER_COUNT_PER_PAGE
+    return page >= get_total_page(handle, year)
 
 
-def fetch_order_item_list_by_year_page(handle, year, page):
-    ORDER_XPATH = '//div[contains(@class, "ecContainer")]/div[contains(@class, "orderList")]'
+def get_total_page(handle, year):
+    return math.ceil(
+        store_yodobashi.handle.get_order_count(handle, year) / store_yodobashi.const.ORDER_COUNT_PER_PAGE
+    )
 
+
+def fetch_order_item_list_by_year_page(handle, year, page):
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
-    total_page = math.ceil(
-        store_yodobashi.handle.get_order_count(handle, year) / store_yodobashi.const.ORDER_COUNT_PER_PAGE
-    )
+    total_page = get_total_page(handle, year)
 
     store_yodobashi.handle.set_status(
         handle,
-        "注文履歴を解析しています... {year}年 {page}/{total_page} ページ".format(year=year, page=page, total_page=total_page),
+        "注文履歴を解析しています... {year}年 {page}/{total_page} ページ".format(
+            year=year, page=page, total_page=total_page
+        ),
     )
 
     logging.info(
         "Check order of {year} page {page}/{total_page}".format(year=year, page=page, total_page=total_page)
     )
 
-    order_list = []
-    for i in range(len(driver.find_elements(By.XPATH, ORDER_XPATH))):
-        order_xpath = "(" + ORDER_XPATH + ")[{index}]".format(index=i + 1)
-
-        date_text = driver.find_element(
-            By.XPATH,
-            order_xpath
-            + '//ul[contains(@class, "hznList")]/li/strong[contains(text(), "注文日")]/following-sibling::span',
-        ).text
-        date = parse_date(date_text)
-
-        no = driver.find_element(
-            By.XPATH,
-            order_xpath
-            + '//ul[contains(@class, "hznList")]/li/strong[contains(text(), "注文番号")]/following-sibling::span',
-        ).text
-
-        order_list.append({"date": date, "no": no})
+    order_list = store_yodobashi.parser.parse_order_list(
+        get_page_source(handle, PAGE_KIND_ORDER_LIST, "{year}/{page}".format(year=year, page=page)),
+        driver.current_url,
+    )
 
     for order_info in order_list:
         if not store_yodobashi.handle.get_order_stat(handle, order_info["no"]):
@@ -286,8 +311,7 @@ def fetch_order_item_list_by_year_page(handle, year, page):
                 )
             )
 
-        store_yodobashi.handle.get_progress_bar(handle, gen_status_label_by_year(year)).update()
-        store_yodobashi.handle.get_progress_bar(handle, STATUS_ORDER_ITEM_ALL).update()
+        update_order_progress(handle, year)
 
         if year == datetime.datetime.now().year:
             last_item = store_yodobashi.handle.get_last_item(handle, year)
@@ -300,11 +324,88 @@ def fetch_order_item_list_by_year_page(handle, year, page):
                 for i in range(total_page):
                     store_yodobashi.handle.set_page_checked(handle, year, i + 1)
 
-        time.sleep(3)
-
     return page >= total_page
 
 
+def fetch_order_item_list_by_year_page_incremental(handle, year, page, verify_since):
+    driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
+
+    total_page = get_total_page(handle, year)
+
+    store_yodobashi.handle.set_status(
+        handle,
+        "新しい注文を探しています... {year}年 {page}/{total_page} ページ".format(
+            year=year, page=page, total_page=total_page
+        ),
+    )
+    logging.info(
+        "Check new order of {year} page {page}/{total_page}".format(
+            year=year, page=page, total_page=total_page
+        )
+    )
+
+    order_list = store_yodobashi.parser.parse_order_list(
+        get_page_source(handle, PAGE_KIND_ORDER_LIST, "{year}/{page}".format(year=year, page=page)),
+        driver.current_url,
+    )
+
+    for order_info in order_list:
+        if store_yodobashi.handle.get_order_stat(handle, order_info["no"]):
+            if order_info["date"] < verify_since:
+                logging.info(
+                    "Known order found: {date} - {no}, stop checking".format(
+                        date=order_info["date"].strftime("%Y-%m-%d"), no=order_info["no"]
+                    )
+                )
+                return (True, True)
+
+            # NOTE: 最近の注文は，後からキャンセルされている可能性があるので取り直す
+            logging.info(
+                "Re-verify order: {date} - {no}".format(
+                    date=order_info["date"].strftime("%Y-%m-%d"), no=order_info["no"]
+                )
+            )
+            store_yodobashi.handle.remove_order_list(handle, [order_info["no"]])
+
+        fetch_order_item_list_by_order_info(handle, order_info)
+        store_yodobashi.handle.store_order_info(handle)
+
+        store_yodobashi.handle.get_progress_bar(handle, STATUS_ORDER_ITEM_NEW).update()
+
+    return (False, page >= total_page)
+
+
+def fetch_order_item_list_incremental(handle, year_list):
+    verify_since = datetime.datetime.now() - store_yodobashi.handle.get_verify_period(handle)
+
+    logging.info("Check new order (re-verify since {date})".format(date=verify_since.strftime("%Y-%m-%d")))
+
+    store_yodobashi.handle.set_progress_bar(handle, STATUS_ORDER_ITEM_NEW, None)
+
+    # NOTE: 注文一覧は新しい順に並んでいるので，新しい年から順に見て既知の注文が出てきたら打ち切る
+    for year in sorted(year_list, reverse=True):
+        page = 1
+        while True:
+            visit_order_list_by_year_page(handle, year, page)
+
+            is_known_found, is_last = fetch_order_item_list_by_year_page_incremental(
+                handle, year, page, verify_since
+            )
+
+            if is_last:
+                break
+
+            page += 1
+
+        # NOTE: 既知の注文より新しい注文は全て取得済みなので，この年は巡回済みとみなせる
+        store_yodobashi.handle.set_year_checked(handle, year)
+
+        if is_known_found:
+            break
+
+    store_yodobashi.handle.get_progress_bar(handle, STATUS_ORDER_ITEM_NEW).update()
+
+
 def fetch_order_item_list_by_year(handle, year):
     visit_order_list_by_year_page(handle, year)
 
@@ -370,28 +471,44 @@ def fetch_year_list(handle):
     return year_list
 
 
-def visit_order_list_by_year_page(handle, year, page=1):
+def click_and_wait_for_reload(handle, xpath):
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
-    driver.find_element(
-        By.XPATH, '//select[@id="selectedPeriod"]/option[contains(@value, {year})]'.format(year=year)
-    ).click()
+    body = driver.find_element(By.XPATH, "//body")
+    wait_for_rate_limit(handle)
+    driver.find_element(By.XPATH, xpath).click()
 
-    driver.find_element(
-        By.XPATH,
-        '//div[contains(@class, "ecHisOderHead")]//span[contains(@class, "yBtnInner")]/a[contains(text(), "検索")]',
-    ).click()
+    wait.until(EC.staleness_of(body))
+    wait_for_loading(handle)
+
+
+def visit_order_list_by_year_page(handle, year, page=1):
+    list_page = store_yodobashi.handle.get_list_page(handle)
 
-    time.sleep(0.2)
+    if list_page == (year, page):
+        return
+
+    # NOTE: 直前のページの次であれば，「次のページ」を1回クリックするだけで済ませる
+    if list_page != (year, page - 1):
+        driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
-    current_page = 1
-    while current_page < page:
         driver.find_element(
-            By.XPATH, '//ul[contains(@class, "hznList")]/li/a[span[contains(text(), "次のページ")]]'
+            By.XPATH, '//select[@id="selectedPeriod"]/option[contains(@value, {year})]'.format(year=year)
         ).click()
 
-        time.sleep(1)
-        current_page += 1
+        click_and_wait_for_reload(
+            handle,
+            '//div[contains(@class, "ecHisOderHead")]//span[contains(@class, "yBtnInner")]'
+            + '/a[contains(text(), "検索")]',
+        )
+        list_page = (year, 1)
+
+    for current_page in range(list_page[1], page):
+        click_and_wait_for_reload(
+            handle, '//ul[contains(@class, "hznList")]/li/a[span[contains(text(), "次のページ")]]'
+        )
+
+    store_yodobashi.handle.set_list_page(handle, year, page)
 
 
 def fetch_order_count_by_year(handle, year):
@@ -434,23 +551,75 @@ def fetch_order_count(handle):
     store_yodobashi.handle.store_order_info(handle)
 
 
+def fetch_order_item_list_by_worker(worker, year_queue):
+    store_yodobashi.handle.set_progress_bar(worker, gen_status_label_by_worker(worker["worker"]), None)
+
+    try:
+        # NOTE: ワーカー毎にブラウザのプロファイルが異なるので，最初にログイン状態を確認しておく
+        visit_url(worker, store_yodobashi.const.HIST_URL)
+        keep_logged_on(worker)
+
+        while True:
+            try:
+                year = year_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            logging.info("Worker {index}: Start {year}".format(index=worker["worker"], year=year))
+            fetch_order_item_list_by_year(worker, year)
+    finally:
+        store_yodobashi.handle.finish_worker(worker)
+
+
+def fetch_order_item_list_by_worker_pool(handle, year_list, worker_count):
+    logging.info(
+        "Check order of {total_year} years with {worker_count} workers".format(
+            total_year=len(year_list), worker_count=worker_count
+        )
+    )
+
+    year_queue = queue.Queue()
+    # NOTE: 新しい年ほど注文が多い傾向があるので，先に着手させる
+    for year in sorted(year_list, reverse=True):
+        year_queue.put(year)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=worker_count) as executor:
+        future_list = [
+            executor.submit(
+                fetch_order_item_list_by_worker,
+                store_yodobashi.handle.create_worker(handle, i + 1),
+                year_queue,
+            )
+            for i in range(worker_count)
+        ]
+
+    for future in future_list:
+        future.result()
+
+
 def fetch_order_item_list_all_year(handle):
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
+    is_incremental = store_yodobashi.handle.is_incremental_ready(handle)
+
     year_list = fetch_year_list(handle)
     fetch_order_count(handle)
 
+    if is_incremental:
+        return fetch_order_item_list_incremental(handle, year_list)
+
     store_yodobashi.handle.set_progress_bar(
         handle, STATUS_ORDER_ITEM_ALL, store_yodobashi.handle.get_total_order_count(handle)
     )
 
+    target_year_list = []
     for year in year_list:
         if (
             (year == datetime.datetime.now().year)
             or (year == store_yodobashi.handle.get_cache_last_modified(handle).year)
             or (not store_yodobashi.handle.get_year_checked(handle, year))
         ):
-            fetch_order_item_list_by_year(handle, year)
+            target_year_list.append(year)
         else:
             logging.info(
                 "Done order of {year} ({year_index}/{total_year}) [cached]".format(
@@ -461,6 +630,14 @@ def fetch_order_item_list_all_year(handle):
                 store_yodobashi.handle.get_order_count(handle, year)
             )
 
+    worker_count = min(store_yodobashi.handle.get_worker_count(handle), len(target_year_list))
+
+    if worker_count <= 1:
+        for year in target_year_list:
+            fetch_order_item_list_by_year(handle, year)
+    else:
+        fetch_order_item_list_by_worker_pool(handle, target_year_list, worker_count)
+
     store_yodobashi.handle.get_progress_bar(handle, STATUS_ORDER_ITEM_ALL).update()
 
 
@@ -475,10 +652,14 @@ def fetch_order_item_list(handle):
             logging.warning("Retry... (count: {count})".format(count=i))
 
         try:
-            return fetch_order_item_list_all_year(handle)
+            fetch_order_item_list_all_year(handle)
+            break
         except Exception as e:
             logging.warning(str(e))
 
+            # NOTE: ログイン状態が原因の可能性もあるので，次はページの内容で確認させる
+            store_yodobashi.handle.invalidate_session(handle)
+
             # NOTE: 下記で例外が発生することがあるので，ここではダンプをしない
             # local_lib.selenium_util.dump_page(
             #     driver, int(random.random() * 100), store_yodobashi.handle.get_debug_dir_path(handle)
@@ -492,6 +673,15 @@ def fetch_order_item_list(handle):
         store_yodobashi.handle.reload_selenium_driver(handle)
         store_yodobashi.handle.reload_progress_manager(handle)
 
+    # NOTE: バックグラウンドで取得中のサムネイルを待つ
+    store_yodobashi.handle.finish_thumb_fetcher(handle)
+
+    logging.info(
+        "Category cache: {hit:,} hit, {miss:,} miss".format(
+            **store_yodobashi.handle.get_category_cache_stat(handle)
+        )
+    )
+
     store_yodobashi.handle.set_status(handle, "注文履歴の収集が完了しました．")
 
 
@@ -506,23 +696,51 @@ def execute_login(handle):
         store_yodobashi.handle.get_login_pass(handle)
     )
 
+    body = driver.find_element(By.XPATH, "//body")
+    wait_for_rate_limit(handle)
     local_lib.selenium_util.click_xpath(
         driver, '//div[contains(@class, "strcBtn30")]/a[span/strong[contains(text(), "ログイン")]]'
     )
 
-    time.sleep(3)
+    try:
+        wait.until(EC.staleness_of(body))
+    except TimeoutException:
+        # NOTE: ログインに失敗して同じページに留まった場合は，呼び出し元でログインフォームの有無を確認する
+        logging.warning("Page is not changed after login")
+
+
+def is_login_page(handle):
+    driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
+
+    return fnmatch.fnmatch(driver.current_url, store_yodobashi.const.LOGIN_URL_PATTERN)
 
 
-def keep_logged_on(handle):
+def keep_logged_on(handle, is_force=False):
     driver, wait = store_yodobashi.handle.get_selenium_driver(handle)
 
+    # NOTE: セッションが有効な間は，ログイン画面に飛ばされた場合のみ確認する．
+    # 注文ページ内にログインフォームが表示された場合は，visit_order_page で検出して is_force で呼ばれる
+    if (not is_force) and store_yodobashi.handle.is_session_valid(handle) and (not is_login_page(handle)):
+        return
+
     wait_for_loading(handle)
 
-    if not local_lib.selenium_util.xpath_exists(driver, '//div[contains(@class, "ecLogin")]'):
+    if not local_lib.selenium_util.xpath_exists(driver, LOGIN_XPATH):
+        if not store_yodobashi.handle.is_session_valid(handle):
+            store_yodobashi.handle.store_session(handle)
         return
 
+    store_yodobashi.handle.invalidate_session(handle)
+
     logging.info("Try to login")
 
+    store_yodobashi.handle.clear_list_page(handle)
+    # NOTE: ログイン時は画像認証が表示されることがあるので，リソースのブロックを解除する
+    store_yodobashi.handle.set_resource_block(handle, False)
+
+    # NOTE: ログインで発行されたクッキーを特定できるよう，ログイン前の状態を控えておく
+    prev_cookie_list = local_lib.selenium_util.get_cookie_list(driver)
+
     for i in range(LOGIN_RETRY_COUNT):
         if i != 0:
             logging.info("Retry to login")
@@ -533,7 +751,8 @@ def keep_logged_on(handle):
 
         if local_lib.selenium_util.xpath_exists(driver, '//h1[contains(text(), "Access Denied")]'):
             raise Exception("ロボットによるアクセスと判断され，ログインできませんでした．")
-        if not local_lib.selenium_util.xpath_exists(driver, '//div[contains(@class, "ecLogin")]'):
+        if not local_lib.selenium_util.xpath_exists(driver, LOGIN_XPATH):
+            store_yodobashi.handle.store_session(handle, prev_cookie_list)
             return
 
         logging.warning("Failed to login")
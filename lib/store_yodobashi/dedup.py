@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+購入履歴のキャッシュから，同じ注文を再解析した際に重複して記録された商品を取り除きます．
+
+Usage:
+  dedup.py [-c CONFIG]
+
+Options:
+  -c CONFIG     : CONFIG を設定ファイルとして読み込んで実行します．[default: config.yaml]
+"""
+
+import logging
+
+import store_yodobashi.handle
+
+
+def dedup(handle):
+    store_yodobashi.handle.set_status(handle, "重複した商品を取り除いています...")
+
+    count = store_yodobashi.handle.dedup_item_list(handle)
+
+    logging.info("Remove duplicated items: {count:,} items".format(count=count))
+
+    return count
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import local_lib.logger
+    import local_lib.config
+
+    args = docopt(__doc__)
+
+    local_lib.logger.init("test", level=logging.INFO)
+
+    config = local_lib.config.load(args["-c"])
+    handle = store_yodobashi.handle.create(config)
+
+    dedup(handle)
+
+    store_yodobashi.handle.finish(handle)
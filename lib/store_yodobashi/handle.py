@@ -2,18 +2,32 @@
 # -*- coding: utf-8 -*-
 import pathlib
 import enlighten
+import bisect
 import datetime
 import functools
 import logging
+import threading
 import traceback
 
 from selenium.webdriver.support.wait import WebDriverWait
 import openpyxl.styles
 
+import store_yodobashi.const
+import store_yodobashi.item
+import store_yodobashi.order_db
+import store_yodobashi.thumbnail
+import local_lib.page_archive
+import local_lib.rate_limiter
 import local_lib.serializer
+import local_lib.thumb_store
 import local_lib.selenium_util
 
-driver_index = 0
+JOURNAL_COMPACT_COUNT = 2000
+
+# NOTE: 商品を Item で保持し，日付順に並べて保存するようになったのがバージョン 1
+ORDER_CACHE_VERSION = 1
+# NOTE: 商品の一覧は，項目ごとにまとめた形式で保存する
+ORDER_CACHE_CODEC_MAP = {"item_list": store_yodobashi.item.CODEC}
 
 
 def create(config):
@@ -21,12 +35,16 @@ def create(config):
         "progress_manager": enlighten.get_manager(),
         "progress_bar": {},
         "config": config,
+        "lock": threading.RLock(),
+        "start_time": datetime.datetime.now(),
     }
 
-    load_order_info(handle)
-
     prepare_directory(handle)
 
+    load_order_info(handle)
+    load_category_cache(handle)
+    load_session(handle)
+
     return handle
 
 
@@ -46,19 +64,159 @@ def prepare_directory(handle):
     get_excel_file_path(handle).parent.mkdir(parents=True, exist_ok=True)
 
 
+def get_crawl_config(handle):
+    return handle["config"].get("crawl", {})
+
+
+def get_worker_count(handle):
+    return get_crawl_config(handle).get("worker", 1)
+
+
+def create_worker(handle, index):
+    # NOTE: 購入履歴データや進捗表示は共有し，Selenium のドライバとサムネイルの取得処理だけをワーカー毎に持たせる
+    get_rate_limiter(handle)
+    get_thumb_store(handle)
+
+    worker = {key: value for key, value in handle.items() if key not in ["selenium", "thumb_fetcher"]}
+    worker["worker"] = index
+
+    return worker
+
+
+def finish_worker(worker):
+    # NOTE: ワーカー毎に作ったサムネイルの取得処理は，ここで取得の完了を待ってから終える
+    finish_thumb_fetcher(worker)
+
+    if "selenium" in worker:
+        try:
+            worker["selenium"]["driver"].quit()
+        except:
+            logging.error(traceback.format_exc())
+        worker.pop("selenium")
+
+
+def get_verify_period(handle):
+    return datetime.timedelta(days=get_crawl_config(handle).get("incremental", {}).get("verify_day", 30))
+
+
+def is_incremental_ready(handle):
+    if not get_crawl_config(handle).get("incremental", {}).get("enable", True):
+        return False
+
+    # NOTE: 前回までに全ての年を巡回し終えている場合のみ，差分だけを巡回する
+    year_list = get_year_list(handle)
+
+    return (len(year_list) != 0) and all(map(lambda year: get_year_checked(handle, year), year_list))
+
+
+def get_block_config(handle):
+    block_config = get_crawl_config(handle).get("block", {})
+
+    return {
+        "enable": block_config.get("enable", True),
+        "pattern": block_config.get("pattern", store_yodobashi.const.BLOCK_URL_PATTERN),
+        "allow": block_config.get("allow", store_yodobashi.const.BLOCK_ALLOW_PAGE_PATTERN),
+    }
+
+
+def set_resource_block(handle, is_block):
+    driver, wait = get_selenium_driver(handle)
+
+    if not get_block_config(handle)["enable"]:
+        return
+    if handle["selenium"].get("block", None) == is_block:
+        return
+
+    local_lib.selenium_util.set_blocked_url(driver, get_block_config(handle)["pattern"] if is_block else [])
+    handle["selenium"]["block"] = is_block
+
+
+def get_rate_limiter(handle):
+    if "rate_limiter" not in handle:
+        rate_config = get_crawl_config(handle).get("rate_limit", {})
+
+        handle["rate_limiter"] = local_lib.rate_limiter.create(
+            rate_config.get("request_per_minute", 20),
+            rate_config.get("burst", 1),
+            rate_config.get("jitter", 0.2),
+        )
+
+    return handle["rate_limiter"]
+
+
 def get_excel_font(handle):
     font_config = handle["config"]["output"]["excel"]["font"]
     return openpyxl.styles.Font(name=font_config["name"], size=font_config["size"])
 
 
+def is_excel_stream_mode(handle):
+    return handle["config"]["output"]["excel"].get("stream", False)
+
+
+def is_excel_incremental_mode(handle):
+    return handle["config"]["output"]["excel"].get("incremental", True)
+
+
+def get_cache_compression(handle):
+    return handle["config"]["data"]["yodobashi"]["cache"].get("compression", "none")
+
+
 def get_caceh_file_path(handle):
     return pathlib.Path(handle["config"]["base_dir"], handle["config"]["data"]["yodobashi"]["cache"]["order"])
 
 
+def get_order_db_file_path(handle):
+    cache_config = handle["config"]["data"]["yodobashi"]["cache"]
+    if "db" in cache_config:
+        return pathlib.Path(handle["config"]["base_dir"], cache_config["db"])
+    else:
+        return get_caceh_file_path(handle).with_name("order.db")
+
+
+def is_db_backend(handle):
+    return handle["config"]["data"]["yodobashi"]["cache"].get("backend", "pickle") == "sqlite"
+
+
+def get_journal_file_path(handle):
+    return get_caceh_file_path(handle).with_suffix(".journal")
+
+
+def get_category_cache_file_path(handle):
+    cache_config = handle["config"]["data"]["yodobashi"]["cache"]
+    if "category" in cache_config:
+        return pathlib.Path(handle["config"]["base_dir"], cache_config["category"])
+    else:
+        return get_caceh_file_path(handle).with_name("category.dat")
+
+
+def get_archive_dir_path(handle):
+    cache_config = handle["config"]["data"]["yodobashi"]["cache"]
+    if "archive" in cache_config:
+        return pathlib.Path(handle["config"]["base_dir"], cache_config["archive"])
+    else:
+        return get_caceh_file_path(handle).with_name("archive")
+
+
+def get_session_file_path(handle):
+    cache_config = handle["config"]["data"]["yodobashi"]["cache"]
+    if "session" in cache_config:
+        return pathlib.Path(handle["config"]["base_dir"], cache_config["session"])
+    else:
+        return get_caceh_file_path(handle).with_name("session.dat")
+
+
 def get_excel_file_path(handle):
     return pathlib.Path(handle["config"]["base_dir"], handle["config"]["output"]["excel"]["table"])
 
 
+def get_excel_manifest_file_path(handle):
+    cache_config = handle["config"]["data"]["yodobashi"]["cache"]
+    if "excel_manifest" in cache_config:
+        return pathlib.Path(handle["config"]["base_dir"], cache_config["excel_manifest"])
+    else:
+        return get_caceh_file_path(handle).with_name("excel_manifest.json")
+
+
 def get_thumb_dir_path(handle):
     return pathlib.Path(handle["config"]["base_dir"], handle["config"]["data"]["yodobashi"]["cache"]["thumb"])
 
@@ -72,8 +230,6 @@ def get_debug_dir_path(handle):
 
 
 def reload_selenium_driver(handle):
-    global driver_index
-
     if "selenium" not in handle:
         return
 
@@ -86,8 +242,7 @@ def reload_selenium_driver(handle):
 
     handle.pop("selenium")
 
-    driver_index += 1
-
+    # NOTE: リトライ時も同じプロファイルを使い，ディスクキャッシュを引き継いだまま再開する
     get_selenium_driver(handle)
 
 
@@ -99,95 +254,433 @@ def reload_progress_manager(handle):
     handle["progress_bar"] = {}
 
 
-def get_selenium_driver(handle):
-    global driver_index
+def set_clear_browser_cache(handle, is_clear):
+    handle["clear_browser_cache"] = is_clear
 
+
+def prepare_browser_cache(handle, driver, profile_name):
+    data_path = get_selenium_data_dir_path(handle)
+
+    cache_size = local_lib.selenium_util.get_cache_size(profile_name, data_path)
+    cleared_time = local_lib.selenium_util.get_cache_cleared_time(profile_name, data_path)
+    clear_day = get_crawl_config(handle).get("browser_cache", {}).get("clear_day", 7)
+
+    if cleared_time is None:
+        # NOTE: 記録が無い場合は，今から期間を数え始める
+        is_clear = False
+        local_lib.selenium_util.mark_cache_cleared(profile_name, data_path)
+    elif handle.get("clear_browser_cache", False) and (cleared_time < handle["start_time"]):
+        # NOTE: 明示的な指定は，実行毎にプロファイル1つにつき1回だけ反映する
+        is_clear = True
+    else:
+        is_clear = (datetime.datetime.now() - cleared_time) > datetime.timedelta(days=clear_day)
+
+    if is_clear:
+        local_lib.selenium_util.clear_cache(driver)
+        local_lib.selenium_util.mark_cache_cleared(profile_name, data_path)
+        logging.info("Clear browser cache ({size:,.1f} MB)".format(size=cache_size / (1024 * 1024)))
+    else:
+        logging.info("Keep browser cache ({size:,.1f} MB)".format(size=cache_size / (1024 * 1024)))
+
+
+def get_selenium_driver(handle):
     if "selenium" in handle:
         return (handle["selenium"]["driver"], handle["selenium"]["wait"])
     else:
+        if handle.get("worker", 0) == 0:
+            profile_name = "Yodhist"
+        else:
+            profile_name = "Yodhist_{worker}".format(worker=handle["worker"])
+
         driver = local_lib.selenium_util.create_driver(
-            "Yodhist_{index}".format(index=driver_index),
+            profile_name,
             get_selenium_data_dir_path(handle),
             # NOTE: Headless Chrome だと，ヨドバシ.com が使用している Akamai にブロックされてしまう
             is_headless=False,
+            is_perf_log=get_block_config(handle)["enable"],
         )
         wait = WebDriverWait(driver, 5)
 
-        local_lib.selenium_util.clear_cache(driver)
+        prepare_browser_cache(handle, driver, profile_name)
 
         handle["selenium"] = {
             "driver": driver,
             "wait": wait,
         }
 
+        set_resource_block(handle, True)
+        restore_session(handle)
+
         return (driver, wait)
 
 
-def record_item(handle, item):
-    handle["order"]["item_list"].append(item)
-    handle["order"]["order_no_stat"][item["no"]] = True
+def get_work_window(handle):
+    driver, wait = get_selenium_driver(handle)
+
+    # NOTE: 注文詳細ページの表示には，一覧ページとは別のタブを使い回す
+    if "work_window" not in handle["selenium"]:
+        handle["selenium"]["work_window"] = local_lib.selenium_util.open_window(driver)
+
+    return handle["selenium"]["work_window"]
+
+
+def set_list_page(handle, year, page):
+    get_selenium_driver(handle)
+    handle["selenium"]["list_page"] = (year, page)
+
+
+def get_list_page(handle):
+    get_selenium_driver(handle)
+    return handle["selenium"].get("list_page", None)
+
+
+def clear_list_page(handle):
+    get_selenium_driver(handle)
+    handle["selenium"].pop("list_page", None)
+
+
+def get_category_cache_ttl(handle):
+    return datetime.timedelta(days=get_crawl_config(handle).get("category_cache_day", 90))
+
+
+def get_cached_category(handle, item_id):
+    with handle["lock"]:
+        if is_db_backend(handle):
+            entry = store_yodobashi.order_db.get_cached_category(handle["order_db"], item_id)
+        else:
+            entry = handle["category_cache"]["item"].get(item_id, None)
+
+        if (entry is None) or (datetime.datetime.now() - entry["time"] > get_category_cache_ttl(handle)):
+            handle["category_cache_stat"]["miss"] += 1
+            return None
+
+        handle["category_cache_stat"]["hit"] += 1
+        return entry["category"]
+
+
+def set_cached_category(handle, item_id, category, time=None):
+    time = datetime.datetime.now() if time is None else time
+
+    with handle["lock"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.set_cached_category(handle["order_db"], item_id, category, time)
+            return
+
+        handle["category_cache"]["item"][item_id] = {"category": category, "time": time}
+        handle["category_cache_stat"]["dirty"] = True
+
+
+def get_pending_category_item_map(handle):
+    with handle["lock"]:
+        if is_db_backend(handle):
+            return store_yodobashi.order_db.get_pending_category_item_map(handle["order_db"])
+
+        item_map = {}
+        for item in handle["order"]["item_list"]:
+            if item["category"] is None:
+                item_map[item["id"]] = item
+
+        return item_map
+
+
+def set_item_category(handle, category_map):
+    with handle["lock"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.set_item_category(handle["order_db"], category_map)
+        else:
+            apply_set_item_category(handle["order"], category_map)
+            append_journal(handle, "set_item_category", category_map)
+
+        for item_id, category in category_map.items():
+            set_cached_category(handle, item_id, category)
+
+
+def get_category_cache_stat(handle):
+    return handle["category_cache_stat"]
+
+
+def set_record_mode(handle, is_record):
+    handle["record"] = is_record
+
+    if is_record:
+        get_page_archive(handle)
+
+
+def is_record_mode(handle):
+    return handle.get("record", False)
+
+
+def get_page_archive(handle):
+    with handle["lock"]:
+        if "page_archive" not in handle:
+            handle["page_archive"] = local_lib.page_archive.create(get_archive_dir_path(handle))
+
+        return handle["page_archive"]
+
+
+def load_session(handle):
+    handle["session"] = local_lib.serializer.load(get_session_file_path(handle), {"cookie_list": []})
+
+
+def is_session_expired(handle):
+    with handle["lock"]:
+        expire = handle["session"].get("expire", None)
+
+        return (expire is not None) and (datetime.datetime.now() >= expire)
+
+
+def is_session_valid(handle):
+    with handle["lock"]:
+        return handle["session"].get("logged_in", False) and not is_session_expired(handle)
+
+
+def get_login_cookie_name_list(cookie_list, prev_cookie_list):
+    prev_cookie_set = {(cookie["name"], cookie["value"]) for cookie in prev_cookie_list}
+
+    return sorted(
+        {cookie["name"] for cookie in cookie_list if (cookie["name"], cookie["value"]) not in prev_cookie_set}
+    )
+
+
+def store_session(handle, prev_cookie_list=None):
+    driver, wait = get_selenium_driver(handle)
+
+    cookie_list = list(
+        filter(
+            lambda cookie: cookie["domain"].endswith(store_yodobashi.const.COOKIE_DOMAIN),
+            local_lib.selenium_util.get_cookie_list(driver),
+        )
+    )
+
+    with handle["lock"]:
+        # NOTE: 有効期限は，ログイン時に発行・更新されたクッキーだけで判断する．
+        # アクセス解析用などの短命なクッキーの期限切れでセッション切れ扱いにしない．
+        if prev_cookie_list is not None:
+            login_cookie_name_list = get_login_cookie_name_list(cookie_list, prev_cookie_list)
+        else:
+            login_cookie_name_list = handle["session"].get("login_cookie_name_list", [])
+
+        expire_list = [
+            cookie["expires"]
+            for cookie in cookie_list
+            if (cookie["name"] in login_cookie_name_list) and (cookie.get("expires", -1) > 0)
+        ]
+
+        # NOTE: ワーカーのハンドルとも共有しているので，置き換えずに中身を更新する
+        handle["session"].clear()
+        handle["session"].update(
+            {
+                "cookie_list": cookie_list,
+                "login_cookie_name_list": login_cookie_name_list,
+                "logged_in": True,
+                "expire": (
+                    datetime.datetime.fromtimestamp(min(expire_list)) if len(expire_list) != 0 else None
+                ),
+            }
+        )
+        local_lib.serializer.store(get_session_file_path(handle), handle["session"])
+
+
+def restore_session(handle):
+    driver, wait = get_selenium_driver(handle)
+
+    # NOTE: 新しく起動したブラウザでも，保存しておいたクッキーでログイン状態を引き継ぐ
+    if (not is_session_expired(handle)) and (len(handle["session"]["cookie_list"]) != 0):
+        local_lib.selenium_util.set_cookie_list(driver, handle["session"]["cookie_list"])
+        logging.info("Restore login session")
+
+
+def invalidate_session(handle):
+    with handle["lock"]:
+        handle["session"]["logged_in"] = False
+
+
+def get_thumb_fetcher(handle):
+    with handle["lock"]:
+        if "thumb_fetcher" not in handle:
+            driver, wait = get_selenium_driver(handle)
+            handle["thumb_fetcher"] = store_yodobashi.thumbnail.create(driver)
+
+        return handle["thumb_fetcher"]
+
+
+def finish_thumb_fetcher(handle):
+    with handle["lock"]:
+        if "thumb_fetcher" in handle:
+            store_yodobashi.thumbnail.finish(handle["thumb_fetcher"])
+            handle.pop("thumb_fetcher")
+
+
+def record_order_item_list(handle, no, date, item_list):
+    item_list = [store_yodobashi.item.create(item) for item in item_list]
+
+    with handle["lock"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.record_order_item_list(handle["order_db"], no, date, item_list)
+            return
+
+        apply_record_order_item_list(handle["order"], no, date, item_list)
+        append_journal(handle, "record_order_item_list", no, date, item_list)
+
+
+def remove_order_list(handle, no_list):
+    with handle["lock"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.remove_order_list(handle["order_db"], no_list)
+            return
+
+        apply_remove_order_list(handle["order"], no_list)
+        append_journal(handle, "remove_order_list", no_list)
+
+
+def dedup_item_list(handle):
+    with handle["lock"]:
+        if is_db_backend(handle):
+            count = store_yodobashi.order_db.dedup_item_list(handle["order_db"])
+        else:
+            count = len(handle["order"]["item_list"])
+            apply_dedup_item_list(handle["order"])
+            append_journal(handle, "dedup_item_list")
+            count -= len(handle["order"]["item_list"])
+
+        store_order_info(handle)
+
+        return count
 
 
 def get_order_stat(handle, no):
+    if is_db_backend(handle):
+        with handle["lock"]:
+            return store_yodobashi.order_db.get_order_stat(handle["order_db"], no)
+
     return no in handle["order"]["order_no_stat"]
 
 
 def get_item_list(handle):
-    return sorted(handle["order"]["item_list"], key=lambda x: x["date"])
+    with handle["lock"]:
+        if is_db_backend(handle):
+            return store_yodobashi.order_db.get_item_list(handle["order_db"])
+
+        # NOTE: item_list は常に日付順に保っているので，コピーせずにそのまま返す
+        return handle["order"]["item_list"]
 
 
 def get_last_item(handle, year):
-    return next(filter(lambda item: item["date"].year == year, reversed(get_item_list(handle))), None)
+    with handle["lock"]:
+        if is_db_backend(handle):
+            return store_yodobashi.order_db.get_last_item(handle["order_db"], year)
+
+        item_list = handle["order"]["item_list"]
+        index = bisect.bisect_left(item_list, datetime.datetime(year + 1, 1, 1), key=lambda x: x["date"])
+
+        if (index == 0) or (item_list[index - 1]["date"].year != year):
+            return None
+
+        return item_list[index - 1]
 
 
 def set_year_list(handle, year_list):
-    handle["order"]["year_list"] = year_list
+    with handle["lock"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.set_year_list(handle["order_db"], year_list)
+            return
+
+        apply_set_year_list(handle["order"], year_list)
+        append_journal(handle, "set_year_list", year_list)
 
 
 def get_year_list(handle):
+    if is_db_backend(handle):
+        with handle["lock"]:
+            return store_yodobashi.order_db.get_year_list(handle["order_db"])
+
     return handle["order"]["year_list"]
 
 
 def set_order_count(handle, year, order_count):
-    handle["order"]["year_count"][year] = order_count
+    with handle["lock"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.set_order_count(handle["order_db"], year, order_count)
+            return
+
+        apply_set_order_count(handle["order"], year, order_count)
+        append_journal(handle, "set_order_count", year, order_count)
 
 
 def get_order_count(handle, year):
+    if is_db_backend(handle):
+        with handle["lock"]:
+            return store_yodobashi.order_db.get_order_count(handle["order_db"], year)
+
     return handle["order"]["year_count"][year]
 
 
 def set_year_checked(handle, year):
-    handle["order"]["year_stat"][year] = True
-    store_order_info(handle)
+    with handle["lock"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.set_year_checked(handle["order_db"], year)
+        else:
+            apply_set_year_checked(handle["order"], year)
+            append_journal(handle, "set_year_checked", year)
+        store_order_info(handle)
 
 
 def get_year_checked(handle, year):
+    if is_db_backend(handle):
+        with handle["lock"]:
+            return store_yodobashi.order_db.get_year_checked(handle["order_db"], year)
+
     return year in handle["order"]["year_stat"]
 
 
 def get_total_order_count(handle):
+    if is_db_backend(handle):
+        with handle["lock"]:
+            return store_yodobashi.order_db.get_total_order_count(handle["order_db"])
+
     return functools.reduce(lambda a, b: a + b, handle["order"]["year_count"].values())
 
 
 def set_page_checked(handle, year, page):
-    if year in handle["order"]["page_stat"]:
-        handle["order"]["page_stat"][year][page] = True
-    else:
-        handle["order"]["page_stat"][year] = {page: True}
+    with handle["lock"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.set_page_checked(handle["order_db"], year, page)
+            return
+
+        apply_set_page_checked(handle["order"], year, page)
+        append_journal(handle, "set_page_checked", year, page)
 
 
 def get_page_checked(handle, year, page):
+    if is_db_backend(handle):
+        with handle["lock"]:
+            return store_yodobashi.order_db.get_page_checked(handle["order_db"], year, page)
+
     if (year in handle["order"]["page_stat"]) and (page in handle["order"]["page_stat"][year]):
         return handle["order"]["page_stat"][year][page]
     else:
         return False
 
 
-def get_thumb_path(handle, item):
-    return get_thumb_dir_path(handle) / (item["id"] + ".png")
+def get_thumb_key(item):
+    return item["id"]
+
+
+def get_thumb_store(handle):
+    with handle["lock"]:
+        if "thumb_store" not in handle:
+            handle["thumb_store"] = local_lib.thumb_store.create(get_thumb_dir_path(handle))
+            # NOTE: 商品毎のファイルで保存していた以前のサムネイルを取り込む
+            local_lib.thumb_store.migrate(handle["thumb_store"], get_thumb_dir_path(handle))
+
+        return handle["thumb_store"]
 
 
 def get_cache_last_modified(handle):
+    if is_db_backend(handle):
+        with handle["lock"]:
+            return store_yodobashi.order_db.get_last_modified(handle["order_db"])
+
     return handle["order"]["last_modified"]
 
 
@@ -228,6 +721,17 @@ def set_status(handle, status, is_error=False):
 
 
 def finish(handle):
+    finish_thumb_fetcher(handle)
+    compact_order_info(handle)
+
+    if "thumb_store" in handle:
+        local_lib.thumb_store.close(handle["thumb_store"])
+        handle.pop("thumb_store")
+
+    if "order_db" in handle:
+        store_yodobashi.order_db.close(handle["order_db"])
+        handle.pop("order_db")
+
     if "selenium" in handle:
         handle["selenium"]["driver"].quit()
         handle.pop("selenium")
@@ -236,13 +740,230 @@ def finish(handle):
     handle.pop("progress_manager")
 
 
+def get_item_key(item):
+    return (item["no"], item["pos"]) if "pos" in item else None
+
+
+def get_legacy_item_key(item):
+    # NOTE: 注文内の位置を記録していなかった頃の商品は，内容で同一性を判断する
+    return (item["no"], item["id"], item["price"], item["count"])
+
+
+def get_dedup_item_key(item, positioned_no_set):
+    if get_item_key(item) is not None:
+        return get_item_key(item)
+    elif item["no"] in positioned_no_set:
+        return None
+    else:
+        return get_legacy_item_key(item)
+
+
+def build_item_index(item_list):
+    item_index = {}
+    for item in item_list:
+        if get_item_key(item) is not None:
+            item_index[get_item_key(item)] = item
+
+    return item_index
+
+
+def remove_item_from_list(order, filter_func, date):
+    item_list = order["item_list"]
+
+    # NOTE: 同じ注文の商品は同じ日付なので，その範囲だけを調べる
+    begin = bisect.bisect_left(item_list, date, key=lambda x: x["date"])
+    end = bisect.bisect_right(item_list, date, key=lambda x: x["date"])
+
+    removed_list = [item for item in item_list[begin:end] if filter_func(item)]
+    item_list[begin:end] = [item for item in item_list[begin:end] if not filter_func(item)]
+
+    return removed_list
+
+
+def apply_record_item(order, item):
+    # NOTE: 以前のジャーナルには辞書のまま記録されている
+    item = store_yodobashi.item.create(item)
+    key = get_item_key(item)
+
+    if key is not None:
+        old_item = order["item_index"].get(key, None)
+        # NOTE: 再解析した注文は追加せずに置き換える．位置を持たない以前の商品も置き換える
+        remove_item_from_list(
+            order,
+            lambda x: (x is old_item) or ((x["no"] == item["no"]) and (get_item_key(x) is None)),
+            item["date"],
+        )
+        order["item_index"][key] = item
+
+    # NOTE: 同じ日付の中では記録した順序を保つ
+    bisect.insort_right(order["item_list"], item, key=lambda x: x["date"])
+    order["order_no_stat"][item["no"]] = True
+
+
+def apply_record_order_item_list(order, no, date, item_list):
+    # NOTE: 再解析した注文は，商品の位置がずれても古いものが残らないよう丸ごと置き換える
+    for item in remove_item_from_list(order, lambda x: x["no"] == no, date):
+        if get_item_key(item) is not None:
+            order["item_index"].pop(get_item_key(item), None)
+
+    for item in item_list:
+        apply_record_item(order, item)
+
+    # NOTE: 全ての商品がキャンセルされた注文も，既知の注文として扱う
+    apply_set_order_stat(order, no)
+
+
+def apply_set_order_stat(order, no):
+    order["order_no_stat"][no] = True
+
+
+def apply_remove_order_list(order, no_list):
+    no_set = set(no_list)
+
+    order["item_list"] = list(filter(lambda item: item["no"] not in no_set, order["item_list"]))
+    for no in no_set:
+        order["order_no_stat"].pop(no, None)
+    order["item_index"] = build_item_index(order["item_list"])
+
+
+def apply_dedup_item_list(order):
+    # NOTE: 位置を持つ商品がある注文は，位置を持たない以前の商品を残したままにする
+    positioned_no_set = {item["no"] for item in order["item_list"] if get_item_key(item) is not None}
+
+    item_map = {}
+    for item in order["item_list"]:
+        key = get_dedup_item_key(item, positioned_no_set)
+        # NOTE: 後から記録したものを優先する
+        if key is not None:
+            item_map[key] = item
+
+    order["item_list"] = [
+        item
+        for item in order["item_list"]
+        if (get_dedup_item_key(item, positioned_no_set) is None)
+        or (item_map[get_dedup_item_key(item, positioned_no_set)] is item)
+    ]
+    order["item_index"] = build_item_index(order["item_list"])
+
+
+def apply_set_item_category(order, category_map):
+    for item in order["item_list"]:
+        if (item["category"] is None) and (item["id"] in category_map):
+            item["category"] = category_map[item["id"]]
+
+
+def apply_set_year_list(order, year_list):
+    order["year_list"] = year_list
+
+
+def apply_set_order_count(order, year, order_count):
+    order["year_count"][year] = order_count
+
+
+def apply_set_year_checked(order, year):
+    order["year_stat"][year] = True
+
+
+def apply_set_page_checked(order, year, page):
+    if year in order["page_stat"]:
+        order["page_stat"][year][page] = True
+    else:
+        order["page_stat"][year] = {page: True}
+
+
+def apply_set_last_modified(order, last_modified):
+    order["last_modified"] = last_modified
+
+
+JOURNAL_OP_FUNC = {
+    "record_item": apply_record_item,
+    "record_order_item_list": apply_record_order_item_list,
+    "remove_order_list": apply_remove_order_list,
+    "set_order_stat": apply_set_order_stat,
+    "set_item_category": apply_set_item_category,
+    "set_year_list": apply_set_year_list,
+    "set_order_count": apply_set_order_count,
+    "set_year_checked": apply_set_year_checked,
+    "set_page_checked": apply_set_page_checked,
+    "set_last_modified": apply_set_last_modified,
+    "dedup_item_list": apply_dedup_item_list,
+}
+
+
+def append_journal(handle, op, *args):
+    # NOTE: ファイルへの書き出しは store_order_info でまとめて行う
+    handle["journal"]["seq"] += 1
+    handle["journal"]["buffer"].append({"seq": handle["journal"]["seq"], "op": op, "args": args})
+
+
+def compact_order_info(handle):
+    with handle["lock"]:
+        if is_db_backend(handle):
+            return
+
+        if (len(handle["journal"]["buffer"]) == 0) and (handle["journal"]["count"] == 0):
+            return
+
+        logging.info("Compact order cache")
+
+        handle["order"]["journal_seq"] = handle["journal"]["seq"]
+        # NOTE: 商品の索引は読み込み時に作り直すので保存しない
+        if not local_lib.serializer.store(
+            get_caceh_file_path(handle),
+            handle["order"],
+            ORDER_CACHE_VERSION,
+            get_cache_compression(handle),
+            ["item_index"],
+            ORDER_CACHE_CODEC_MAP,
+        ):
+            return
+
+        local_lib.serializer.truncate(get_journal_file_path(handle))
+        handle["journal"]["buffer"] = []
+        handle["journal"]["count"] = 0
+
+
 def store_order_info(handle):
-    handle["order"]["last_modified"] = datetime.datetime.now()
+    with handle["lock"]:
+        if is_db_backend(handle):
+            # NOTE: 変更はトランザクションとしてまとめて確定する
+            store_yodobashi.order_db.set_last_modified(handle["order_db"], datetime.datetime.now())
+            store_yodobashi.order_db.commit(handle["order_db"])
+            return
 
-    local_lib.serializer.store(get_caceh_file_path(handle), handle["order"])
+        now = datetime.datetime.now()
+        apply_set_last_modified(handle["order"], now)
+        append_journal(handle, "set_last_modified", now)
 
+        local_lib.serializer.append(get_journal_file_path(handle), handle["journal"]["buffer"])
+        handle["journal"]["count"] += len(handle["journal"]["buffer"])
+        handle["journal"]["buffer"] = []
 
-def load_order_info(handle):
+        if handle["journal"]["count"] >= JOURNAL_COMPACT_COUNT:
+            compact_order_info(handle)
+
+        if handle["category_cache_stat"]["dirty"]:
+            local_lib.serializer.store(get_category_cache_file_path(handle), handle["category_cache"])
+            handle["category_cache_stat"]["dirty"] = False
+
+
+def load_journal(handle):
+    record_list = local_lib.serializer.load_journal(get_journal_file_path(handle))
+
+    # NOTE: スナップショットに反映済みのレコードは読み飛ばす
+    seq = handle["order"].get("journal_seq", 0)
+    for record in record_list:
+        if record["seq"] <= seq:
+            continue
+        JOURNAL_OP_FUNC[record["op"]](handle["order"], *record["args"])
+        seq = record["seq"]
+
+    handle["journal"] = {"seq": seq, "buffer": [], "count": len(record_list)}
+
+    logging.info("Load order cache journal: {count:,} records".format(count=len(record_list)))
+
+
+def load_pickle_order_info(handle):
     handle["order"] = local_lib.serializer.load(
         get_caceh_file_path(handle),
         {
@@ -254,12 +975,67 @@ def load_order_info(handle):
             "order_no_stat": {},
             "last_modified": datetime.datetime(1994, 7, 5),
         },
+        # NOTE: 巡回状況の確認だけで済む場合もあるので，商品の一覧は参照されるまで読み込まない
+        ["item_list"],
+        ORDER_CACHE_CODEC_MAP,
     )
+    order = handle["order"]
+
+    if local_lib.serializer.get_version(order) < ORDER_CACHE_VERSION:
+        # NOTE: 以前の形式のキャッシュは辞書で保持しており，日付順とも限らないので，読み込み時に一度だけ変換する
+        local_lib.serializer.transform(
+            order,
+            "item_list",
+            lambda item_list: sorted(map(store_yodobashi.item.create, item_list), key=lambda x: x["date"]),
+        )
+    local_lib.serializer.set_lazy(order, "item_index", lambda: build_item_index(order["item_list"]))
+
+    load_journal(handle)
+
+
+def load_db_order_info(handle):
+    handle["order_db"] = store_yodobashi.order_db.open_db(get_order_db_file_path(handle))
+
+    if store_yodobashi.order_db.is_migrated(handle["order_db"]):
+        return
+
+    # NOTE: 初回は既存のキャッシュファイルの内容をデータベースに移行する
+    load_pickle_order_info(handle)
+    category_cache = local_lib.serializer.load(get_category_cache_file_path(handle), {"item": {}})
+    store_yodobashi.order_db.migrate(handle["order_db"], handle.pop("order"), category_cache)
+    handle.pop("journal")
+
+
+def load_order_info(handle):
+    if is_db_backend(handle):
+        load_db_order_info(handle)
+    else:
+        load_pickle_order_info(handle)
 
     # NOTE: 再開した時には巡回すべきなので削除しておく
     for year in [
         datetime.datetime.now().year,
         get_cache_last_modified(handle).year,
     ]:
-        if year in handle["order"]["page_stat"]:
+        if is_db_backend(handle):
+            store_yodobashi.order_db.clear_page_checked(handle["order_db"], year)
+        elif year in handle["order"]["page_stat"]:
             del handle["order"]["page_stat"][year]
+
+
+def load_category_cache(handle):
+    handle["category_cache_stat"] = {"hit": 0, "miss": 0, "dirty": False}
+
+    if is_db_backend(handle):
+        return
+
+    is_exist = get_category_cache_file_path(handle).exists()
+    handle["category_cache"] = local_lib.serializer.load(get_category_cache_file_path(handle), {"item": {}})
+
+    if is_exist:
+        return
+
+    # NOTE: キャッシュ導入前に収集した商品のカテゴリも使えるようにしておく
+    for item in handle["order"]["item_list"]:
+        if (item["category"] is not None) and (item["id"] not in handle["category_cache"]["item"]):
+            set_cached_category(handle, item["id"], item["category"], get_cache_last_modified(handle))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+購入した商品の情報を，メモリ効率の良い形式で保持します．
+
+Usage:
+  item.py [-c CONFIG]
+  item.py -b COUNT...
+
+Options:
+  -c CONFIG     : CONFIG を設定ファイルとして読み込んで実行します．[default: config.yaml]
+  -b COUNT      : 指定した件数の商品で，キャッシュの読み書きの速度を pickle と比較します．
+"""
+
+import logging
+import sys
+
+FIELD_LIST = ("name", "price", "count", "url", "id", "category", "date", "no", "pos")
+
+# NOTE: 同じカテゴリのパンくずリストは，全ての商品で1つのタプルを共有する
+category_pool = {}
+
+
+def intern_category(category):
+    if category is None:
+        return None
+    # NOTE: プール済みのタプルはそのまま使う (キャッシュの読み込み時はほとんどがこれになる)
+    if (type(category) is tuple) and (category_pool.get(category, None) is category):
+        return category
+
+    category = tuple(map(sys.intern, category))
+
+    return category_pool.setdefault(category, category)
+
+
+class Item:
+    # NOTE: 商品数が多くてもメモリを消費しないよう，辞書ではなくスロットで保持する．
+    # 既存のコードからは辞書と同じように item["name"] の形で参照できる．
+    __slots__ = FIELD_LIST
+
+    def __init__(self, name, price, count, url, id, category, date, no, pos=None):
+        self.name = name
+        self.price = price
+        self.count = count
+        self.url = url
+        self.id = sys.intern(id)
+        self.category = intern_category(category)
+        self.date = date
+        self.no = sys.intern(no)
+        self.pos = pos
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELD_LIST:
+            raise KeyError(key)
+
+        setattr(self, key, intern_category(value) if key == "category" else value)
+
+    def __contains__(self, key):
+        # NOTE: 注文内の位置は，記録していなかった頃の商品では存在しない扱いにする
+        return (key in FIELD_LIST) and ((key != "pos") or (self.pos is not None))
+
+    def __reduce__(self):
+        # NOTE: キーを含めず値だけを保存する．読み込み時にはカテゴリが再びプールされる
+        return (Item, tuple(getattr(self, key) for key in FIELD_LIST))
+
+    def __repr__(self):
+        return "Item({value})".format(
+            value=", ".join("{key}={value!r}".format(key=key, value=self[key]) for key in self.keys())
+        )
+
+    def keys(self):
+        return [key for key in FIELD_LIST if key in self]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def copy(self):
+        return Item(*(getattr(self, key) for key in FIELD_LIST))
+
+
+def create(item):
+    if isinstance(item, Item):
+        return item
+
+    return Item(*(item.get(key, None) for key in FIELD_LIST))
+
+
+def encode_list(item_list):
+    # NOTE: 商品ごとではなく項目ごとのリストにまとめて保存する．読み込み時に商品ごとの復元処理を
+    # 呼び出さずに済み，カテゴリは重複を除いた一覧への番号で持つ
+    category_index = {}
+    column_map = {key: [getattr(item, key) for item in item_list] for key in FIELD_LIST if key != "category"}
+    column_map["category"] = [
+        None if item.category is None else category_index.setdefault(item.category, len(category_index))
+        for item in item_list
+    ]
+    column_map["category_list"] = list(category_index.keys())
+
+    return column_map
+
+
+def decode_list(column_map):
+    category_list = [intern_category(category) for category in column_map["category_list"]]
+    column_map["category"] = [
+        None if index is None else category_list[index] for index in column_map["category"]
+    ]
+
+    return list(map(Item, *(column_map[key] for key in FIELD_LIST)))
+
+
+# NOTE: local_lib.serializer でキャッシュの商品一覧を変換する際に使う
+CODEC = (encode_list, decode_list)
+
+
+def benchmark(count):
+    import datetime
+
+    import local_lib.serializer
+
+    category_list = [
+        ["家電", "パソコン", "周辺機器"],
+        ["家電", "カメラ", "交換レンズ"],
+        ["本", "コミック"],
+        ["食品", "飲料", "水"],
+    ]
+    data = {
+        "year_count": {year: 100 for year in range(2000, 2025)},
+        "item_list": [
+            Item(
+                "商品 {i}".format(i=i),
+                i * 10,
+                1,
+                "https://www.yodobashi.com/product-detail/{i:012d}/".format(i=i),
+                "{i:012d}".format(i=i),
+                category_list[i % len(category_list)],
+                datetime.datetime(2020, 1, 1) + datetime.timedelta(hours=i),
+                "{no:010d}".format(no=i // 3),
+                i % 3,
+            )
+            for i in range(count)
+        ],
+    }
+
+    logging.info("Benchmark with {count:,} items".format(count=count))
+
+    return local_lib.serializer.benchmark(data, ["item_list"], {"item_list": CODEC})
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import local_lib.logger
+    import local_lib.config
+    import store_yodobashi.handle
+
+    args = docopt(__doc__)
+
+    local_lib.logger.init("test", level=logging.INFO)
+
+    if len(args["-b"]) != 0:
+        for count in args["-b"]:
+            benchmark(int(count))
+    else:
+        config = local_lib.config.load(args["-c"])
+        handle = store_yodobashi.handle.create(config)
+
+        item_list = store_yodobashi.handle.get_item_list(handle)
+
+        logging.info(
+            "Items: {item:,}, distinct categories: {category:,}".format(
+                item=len(item_list), category=len(category_pool)
+            )
+        )
+
+        store_yodobashi.handle.finish(handle)
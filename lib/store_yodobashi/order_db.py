@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+購入履歴を SQLite データベースに保存します．
+
+Usage:
+  order_db.py -d DB [-y YEAR]
+
+Options:
+  -d DB         : データベースのファイルを指定します．
+  -y YEAR       : 指定した年の購入履歴を表示します．
+"""
+
+import datetime
+import json
+import logging
+import sqlite3
+
+import store_yodobashi.item
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_info (
+    no TEXT PRIMARY KEY,
+    date TEXT
+);
+CREATE TABLE IF NOT EXISTS item (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    no TEXT NOT NULL REFERENCES order_info(no),
+    date TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    url TEXT,
+    category TEXT
+);
+CREATE INDEX IF NOT EXISTS item_date ON item(date);
+CREATE INDEX IF NOT EXISTS item_no ON item(no);
+CREATE INDEX IF NOT EXISTS item_id ON item(id);
+CREATE INDEX IF NOT EXISTS item_pending ON item(id) WHERE category IS NULL;
+CREATE TABLE IF NOT EXISTS category (
+    id TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS year_stat (
+    year INTEGER PRIMARY KEY,
+    listed INTEGER NOT NULL DEFAULT 0,
+    count INTEGER,
+    checked INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS page_stat (
+    year INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    PRIMARY KEY (year, page)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+ITEM_COLUMN = "no, pos, date, id, name, price, count, url, category"
+
+
+def open_db(db_path):
+    conn = sqlite3.connect(str(db_path), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+
+    # NOTE: 注文内の位置を持たない以前のデータベースには列を追加する
+    if "pos" not in [row["name"] for row in conn.execute("PRAGMA table_info(item)")]:
+        conn.execute("ALTER TABLE item ADD COLUMN pos INTEGER")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS item_key ON item(no, pos)")
+    # NOTE: 商品の無い注文は日付が分からないので，日付を必須にしていた以前のデータベースは作り直す
+    date_column = next(row for row in conn.execute("PRAGMA table_info(order_info)") if row["name"] == "date")
+    if date_column["notnull"] == 1:
+        conn.executescript("""
+            CREATE TABLE order_info_new (no TEXT PRIMARY KEY, date TEXT);
+            INSERT INTO order_info_new (no, date) SELECT no, date FROM order_info;
+            DROP TABLE order_info;
+            ALTER TABLE order_info_new RENAME TO order_info;
+            """)
+    conn.commit()
+
+    return conn
+
+
+def commit(conn):
+    conn.commit()
+
+
+def close(conn):
+    conn.commit()
+    conn.close()
+
+
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+    return default if row is None else row["value"]
+
+
+def set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def encode_category(category):
+    return None if category is None else json.dumps(category, ensure_ascii=False)
+
+
+def decode_category(category_text):
+    return None if category_text is None else json.loads(category_text)
+
+
+def row_to_item(row):
+    return store_yodobashi.item.Item(
+        row["name"],
+        row["price"],
+        row["count"],
+        row["url"],
+        row["id"],
+        decode_category(row["category"]),
+        datetime.datetime.fromisoformat(row["date"]),
+        row["no"],
+        row["pos"],
+    )
+
+
+def insert_item(conn, item):
+    conn.execute(
+        "INSERT INTO item ({column}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)".format(column=ITEM_COLUMN),
+        (
+            item["no"],
+            item.get("pos", None),
+            item["date"].isoformat(),
+            item["id"],
+            item["name"],
+            item["price"],
+            item["count"],
+            item["url"],
+            encode_category(item["category"]),
+        ),
+    )
+
+
+def record_item(conn, item):
+    set_order_stat(conn, item["no"], item["date"])
+    if "pos" in item:
+        # NOTE: 再解析した注文は追加せずに置き換える．位置を持たない以前の商品も置き換える
+        conn.execute("DELETE FROM item WHERE no = ? AND pos IS NULL", (item["no"],))
+        conn.execute("DELETE FROM item WHERE no = ? AND pos = ?", (item["no"], item["pos"]))
+
+    insert_item(conn, item)
+
+
+def record_order_item_list(conn, no, date, item_list):
+    # NOTE: 再解析した注文は，商品の位置がずれても古いものが残らないよう丸ごと置き換える．
+    # 全ての商品がキャンセルされた注文も，既知の注文として扱う
+    set_order_stat(conn, no, date)
+    conn.execute("DELETE FROM item WHERE no = ?", (no,))
+
+    for item in item_list:
+        insert_item(conn, item)
+
+
+def set_order_stat(conn, no, date):
+    conn.execute(
+        "INSERT OR IGNORE INTO order_info (no, date) VALUES (?, ?)",
+        (no, None if date is None else date.isoformat()),
+    )
+
+
+def remove_order_list(conn, no_list):
+    for no in no_list:
+        conn.execute("DELETE FROM item WHERE no = ?", (no,))
+        conn.execute("DELETE FROM order_info WHERE no = ?", (no,))
+
+
+def dedup_item_list(conn):
+    # NOTE: 後から記録したものを優先する．位置を持たない以前の商品は内容で同一性を判断するが，
+    # 位置を持つ商品がある注文ではそのまま残す
+    return conn.execute("""
+        DELETE FROM item WHERE seq NOT IN (
+            SELECT MAX(seq) FROM item WHERE pos IS NOT NULL GROUP BY no, pos
+            UNION
+            SELECT MAX(seq) FROM item WHERE pos IS NULL GROUP BY no, id, price, count
+        ) AND NOT (pos IS NULL AND no IN (SELECT no FROM item WHERE pos IS NOT NULL))
+        """).rowcount
+
+
+def get_order_stat(conn, no):
+    return conn.execute("SELECT 1 FROM order_info WHERE no = ?", (no,)).fetchone() is not None
+
+
+def get_item_list(conn):
+    return list(
+        map(
+            row_to_item,
+            conn.execute("SELECT {column} FROM item ORDER BY date, seq".format(column=ITEM_COLUMN)),
+        )
+    )
+
+
+def get_last_item(conn, year):
+    row = conn.execute(
+        "SELECT {column} FROM item WHERE date >= ? AND date < ? ORDER BY date DESC, seq DESC LIMIT 1".format(
+            column=ITEM_COLUMN
+        ),
+        (datetime.datetime(year, 1, 1).isoformat(), datetime.datetime(year + 1, 1, 1).isoformat()),
+    ).fetchone()
+
+    return None if row is None else row_to_item(row)
+
+
+def get_pending_category_item_map(conn):
+    item_map = {}
+    for row in conn.execute(
+        "SELECT {column} FROM item WHERE category IS NULL ORDER BY seq".format(column=ITEM_COLUMN)
+    ):
+        item_map[row["id"]] = row_to_item(row)
+
+    return item_map
+
+
+def set_item_category(conn, category_map):
+    for item_id, category in category_map.items():
+        conn.execute(
+            "UPDATE item SET category = ? WHERE id = ? AND category IS NULL",
+            (encode_category(category), item_id),
+        )
+
+
+def get_cached_category(conn, item_id):
+    row = conn.execute("SELECT category, time FROM category WHERE id = ?", (item_id,)).fetchone()
+    if row is None:
+        return None
+
+    return {
+        "category": decode_category(row["category"]),
+        "time": datetime.datetime.fromisoformat(row["time"]),
+    }
+
+
+def set_cached_category(conn, item_id, category, time):
+    conn.execute(
+        "INSERT OR REPLACE INTO category (id, category, time) VALUES (?, ?, ?)",
+        (item_id, encode_category(category), time.isoformat()),
+    )
+
+
+def set_year_list(conn, year_list):
+    conn.execute("UPDATE year_stat SET listed = 0")
+    for year in year_list:
+        conn.execute("INSERT OR IGNORE INTO year_stat (year) VALUES (?)", (year,))
+        conn.execute("UPDATE year_stat SET listed = 1 WHERE year = ?", (year,))
+
+
+def get_year_list(conn):
+    return [row["year"] for row in conn.execute("SELECT year FROM year_stat WHERE listed = 1 ORDER BY year")]
+
+
+def set_order_count(conn, year, order_count):
+    conn.execute("INSERT OR IGNORE INTO year_stat (year) VALUES (?)", (year,))
+    conn.execute("UPDATE year_stat SET count = ? WHERE year = ?", (order_count, year))
+
+
+def get_order_count(conn, year):
+    row = conn.execute("SELECT count FROM year_stat WHERE year = ?", (year,)).fetchone()
+    if (row is None) or (row["count"] is None):
+        raise KeyError(year)
+
+    return row["count"]
+
+
+def get_total_order_count(conn):
+    return conn.execute("SELECT COALESCE(SUM(count), 0) AS total FROM year_stat").fetchone()["total"]
+
+
+def set_year_checked(conn, year):
+    conn.execute("INSERT OR IGNORE INTO year_stat (year) VALUES (?)", (year,))
+    conn.execute("UPDATE year_stat SET checked = 1 WHERE year = ?", (year,))
+
+
+def get_year_checked(conn, year):
+    row = conn.execute("SELECT checked FROM year_stat WHERE year = ?", (year,)).fetchone()
+
+    return (row is not None) and (row["checked"] == 1)
+
+
+def set_page_checked(conn, year, page):
+    conn.execute("INSERT OR IGNORE INTO page_stat (year, page) VALUES (?, ?)", (year, page))
+
+
+def get_page_checked(conn, year, page):
+    return (
+        conn.execute("SELECT 1 FROM page_stat WHERE year = ? AND page = ?", (year, page)).fetchone()
+        is not None
+    )
+
+
+def clear_page_checked(conn, year):
+    conn.execute("DELETE FROM page_stat WHERE year = ?", (year,))
+
+
+def set_last_modified(conn, last_modified):
+    set_meta(conn, "last_modified", last_modified.isoformat())
+
+
+def get_last_modified(conn):
+    return datetime.datetime.fromisoformat(
+        get_meta(conn, "last_modified", datetime.datetime(1994, 7, 5).isoformat())
+    )
+
+
+def is_migrated(conn):
+    return get_meta(conn, "migrated", None) is not None
+
+
+def migrate(conn, order, category_cache):
+    logging.info("Migrate {count:,} items to database".format(count=len(order["item_list"])))
+
+    for item in order["item_list"]:
+        record_item(conn, item)
+    # NOTE: 全ての商品がキャンセルされた注文も，既知の注文として移行する
+    for no in order["order_no_stat"].keys():
+        set_order_stat(conn, no, None)
+
+    set_year_list(conn, order["year_list"])
+    for year, order_count in order["year_count"].items():
+        set_order_count(conn, year, order_count)
+    for year in order["year_stat"].keys():
+        set_year_checked(conn, year)
+    for year, page_map in order["page_stat"].items():
+        for page in page_map.keys():
+            set_page_checked(conn, year, page)
+    set_last_modified(conn, order["last_modified"])
+
+    for item_id, entry in category_cache["item"].items():
+        set_cached_category(conn, item_id, entry["category"], entry["time"])
+    # NOTE: キャッシュ導入前に収集した商品のカテゴリも使えるようにしておく
+    for item in order["item_list"]:
+        if item["category"] is not None:
+            conn.execute(
+                "INSERT OR IGNORE INTO category (id, category, time) VALUES (?, ?, ?)",
+                (item["id"], encode_category(item["category"]), order["last_modified"].isoformat()),
+            )
+
+    set_meta(conn, "migrated", datetime.datetime.now().isoformat())
+    conn.commit()
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import local_lib.logger
+
+    args = docopt(__doc__)
+
+    local_lib.logger.init("test", level=logging.INFO)
+
+    conn = open_db(args["-d"])
+
+    logging.info("Years: {year_list}".format(year_list=get_year_list(conn)))
+    logging.info("Total orders: {count:,}".format(count=get_total_order_count(conn)))
+
+    if args["-y"] is not None:
+        for item in get_item_list(conn):
+            if item["date"].year == int(args["-y"]):
+                logging.info(
+                    "{date} {no} {name} {price:,}円".format(
+                        date=item["date"].strftime("%Y-%m-%d"),
+                        no=item["no"],
+                        name=item["name"],
+                        price=item["price"],
+                    )
+                )
+
+    close(conn)
@@ -4,14 +4,16 @@
 ヨドバシ.com の購入履歴情報をエクセルファイルに書き出します．
 
 Usage:
-  order_history.py [-c CONFIG] [-o EXCEL] [-N]
+  order_history.py [-c CONFIG] [-o EXCEL] [-N] [-F]
 
 Options:
   -c CONFIG     : CONFIG を設定ファイルとして読み込んで実行します．[default: config.yaml]
   -o EXCEL      : 生成する Excel ファイルを指定します．[default: amazhist.xlsx]
   -N            : サムネイル画像を含めないようにします．
+  -F            : 既存のファイルに追記せず，全体を作り直します．
 """
 
+import io
 import logging
 
 import openpyxl
@@ -22,8 +24,10 @@ import openpyxl.drawing.xdr
 import openpyxl.drawing.spreadsheet_drawing
 
 import local_lib.openpyxl_util
+import local_lib.xlsx_append
+import store_yodobashi.const
 import store_yodobashi.handle
-import store_yodobashi.crawler
+import store_yodobashi.thumbnail
 
 STATUS_INSERT_ITEM = "[generate] Insert item"
 STATUS_ALL = "[generate] Excel file"
@@ -96,53 +100,150 @@ SHEET_DEF = {
                 "width": 28,
                 "format": "@",
                 "wrap": True,
-                "link_func": lambda item: store_yodobashi.crawler.gen_order_url_from_no(item["no"]),
+                "link_func": lambda item: store_yodobashi.const.ORDER_URL_BY_NO.format(no=item["no"]),
             },
         },
     },
 }
 
 
-def generate_sheet(handle, book, is_need_thumb=True):
-    item_list = store_yodobashi.handle.get_item_list(handle)
+def get_thumb_size():
+    # NOTE: サムネイルは，画像を貼るセルに収まる大きさに縮小して保存する
+    return local_lib.openpyxl_util.get_image_box_size(
+        SHEET_DEF["TABLE_HEADER"]["col"]["image"]["width"], SHEET_DEF["TABLE_HEADER"]["row"]["height"]
+    )
+
+
+def get_thumb_key(handle, item):
+    return store_yodobashi.thumbnail.prepare_normalized(
+        store_yodobashi.handle.get_thumb_store(handle),
+        store_yodobashi.handle.get_thumb_key(item),
+        get_thumb_size(),
+    )
+
+
+def prepare_thumb_image_list(handle, item_list, is_need_thumb):
+    if not is_need_thumb:
+        return [None] * len(item_list)
+
+    store_yodobashi.handle.set_status(handle, "サムネイル画像を準備しています...")
+
+    return local_lib.openpyxl_util.prepare_thumb_image_list(
+        item_list,
+        SHEET_DEF,
+        store_yodobashi.handle.get_thumb_store(handle),
+        lambda item: get_thumb_key(handle, item),
+    )
 
-    store_yodobashi.handle.set_progress_bar(handle, STATUS_INSERT_ITEM, len(item_list))
+
+def get_sheet_signature(handle, is_need_thumb):
+    return local_lib.openpyxl_util.gen_sheet_signature(
+        SHEET_DEF, store_yodobashi.handle.get_excel_font(handle), is_need_thumb
+    )
+
+
+def get_written_count(handle, excel_file, is_need_thumb, manifest_item_list):
+    base_manifest_item_list = local_lib.openpyxl_util.load_manifest(
+        store_yodobashi.handle.get_excel_manifest_file_path(handle),
+        excel_file,
+        get_sheet_signature(handle, is_need_thumb),
+    )
+    if base_manifest_item_list is None:
+        return None
+
+    return local_lib.openpyxl_util.get_written_count(base_manifest_item_list, manifest_item_list)
+
+
+def generate_sheet(handle, book, item_list, thumb_info_list, is_need_thumb=True, skip_count=0):
+    store_yodobashi.handle.set_progress_bar(handle, STATUS_INSERT_ITEM, len(item_list) - skip_count)
 
     local_lib.openpyxl_util.generate_list_sheet(
         book,
         item_list,
         SHEET_DEF,
         is_need_thumb,
-        lambda item: store_yodobashi.handle.get_thumb_path(handle, item),
+        store_yodobashi.handle.get_thumb_store(handle),
+        thumb_info_list,
         lambda status: store_yodobashi.handle.set_status(handle, status),
         lambda: store_yodobashi.handle.get_progress_bar(handle, STATUS_ALL).update(),
         lambda: store_yodobashi.handle.get_progress_bar(handle, STATUS_INSERT_ITEM).update(),
+        skip_count,
     )
 
 
-def generate_table_excel(handle, excel_file, is_need_thumb=True):
+def save_excel(book, excel_file, skip_count):
+    if skip_count == 0:
+        local_lib.openpyxl_util.save_book(book, excel_file)
+        return True
+
+    # NOTE: 追記する行だけのファイルをメモリ上に作り，既存のファイルに継ぎ足す
+    buf = io.BytesIO()
+    local_lib.openpyxl_util.save_book(book, buf)
+
+    return local_lib.xlsx_append.append(excel_file, buf.getvalue(), SHEET_DEF["TABLE_HEADER"]["row"]["pos"])
+
+
+def generate_table_excel(handle, excel_file, is_need_thumb=True, is_full_rebuild=False):
     store_yodobashi.handle.set_status(handle, "エクセルファイルの作成を開始します...")
     store_yodobashi.handle.set_progress_bar(handle, STATUS_ALL, 2 + 3 * 1)
 
     logging.info("Start to Generate excel file")
 
-    book = openpyxl.Workbook()
+    item_list = store_yodobashi.handle.get_item_list(handle)
+    thumb_info_list = prepare_thumb_image_list(handle, item_list, is_need_thumb)
+    manifest_item_list = local_lib.openpyxl_util.gen_manifest_item_list(item_list, thumb_info_list)
+
+    is_incremental = store_yodobashi.handle.is_excel_incremental_mode(handle) and not is_full_rebuild
+    skip_count = (
+        get_written_count(handle, excel_file, is_need_thumb, manifest_item_list) if is_incremental else None
+    )
+
+    if skip_count is None:
+        skip_count = 0
+    elif skip_count == len(item_list):
+        logging.info("Excel file is up to date")
+
+        # NOTE: 書き出しを省略した分も進捗を進めて，通常と同じ状態で終える
+        progress_bar = store_yodobashi.handle.get_progress_bar(handle, STATUS_ALL)
+        progress_bar.update(progress_bar.total - progress_bar.count)
+        store_yodobashi.handle.set_status(handle, "完了しました！")
+        return
+    else:
+        logging.info("Append {count:,} items to excel file".format(count=len(item_list) - skip_count))
+
+    # NOTE: 追記する場合は既存の行を参照しないので，行を順に書き出すモードにはしない
+    book = openpyxl.Workbook(
+        write_only=store_yodobashi.handle.is_excel_stream_mode(handle) and (skip_count == 0)
+    )
     book._named_styles["Normal"].font = store_yodobashi.handle.get_excel_font(handle)
 
     store_yodobashi.handle.get_progress_bar(handle, STATUS_ALL).update()
 
-    generate_sheet(handle, book, is_need_thumb)
+    generate_sheet(handle, book, item_list, thumb_info_list, is_need_thumb, skip_count)
 
-    book.remove(book.worksheets[0])
+    if not book.write_only:
+        book.remove(book.worksheets[0])
 
     store_yodobashi.handle.set_status(handle, "エクセルファイルを書き出しています...")
 
-    book.save(excel_file)
+    is_saved = save_excel(book, excel_file, skip_count)
 
     store_yodobashi.handle.get_progress_bar(handle, STATUS_ALL).update()
 
     book.close()
 
+    if not is_saved:
+        logging.warning("Unable to append to excel file, so regenerate it")
+        return generate_table_excel(handle, excel_file, is_need_thumb, True)
+
+    if store_yodobashi.handle.is_excel_incremental_mode(handle):
+        local_lib.openpyxl_util.store_manifest(
+            store_yodobashi.handle.get_excel_manifest_file_path(handle),
+            excel_file,
+            get_sheet_signature(handle, is_need_thumb),
+            manifest_item_list,
+        )
+
     store_yodobashi.handle.get_progress_bar(handle, STATUS_ALL).update()
 
     store_yodobashi.handle.set_status(handle, "完了しました！")
@@ -163,9 +264,10 @@ if __name__ == "__main__":
     config = local_lib.config.load(args["-c"])
     excel_file = args["-o"]
     is_need_thumb = not args["-N"]
+    is_full_rebuild = args["-F"]
 
     handle = store_yodobashi.handle.create(config)
 
-    generate_table_excel(handle, excel_file, is_need_thumb)
+    generate_table_excel(handle, excel_file, is_need_thumb, is_full_rebuild)
 
     store_yodobashi.handle.finish(handle)
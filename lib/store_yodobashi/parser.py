@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ヨドバシ.com のページ (HTML) を解析します．
+
+Usage:
+  parser.py -t TYPE [-u URL] HTML
+
+Options:
+  -t TYPE       : ページの種類 (order_list, order, item) を指定します．
+  -u URL        : ページの URL．相対リンクの解決に使用します．[default: https://order.yodobashi.com/]
+"""
+
+import datetime
+import re
+
+import lxml.html
+
+ORDER_LIST_XPATH = '//div[contains(@class, "ecContainer")]/div[contains(@class, "orderList")]'
+ORDER_ITEM_XPATH = '//div[contains(@class, "orderDetailBlock")]'
+
+
+def parse_date(date_text):
+    return datetime.datetime.strptime(date_text, "%Y年%m月%d日")
+
+
+def gen_item_id_from_url(url):
+    return re.match(r"https://www.yodobashi.com/product-detail/([^/]+)/", url).group(1)
+
+
+def gen_item_id_from_thumb_url(url):
+    return re.match(r".*/\d+/(\d+)_\d+\.", url).group(1)
+
+
+def parse_html(page_source, url):
+    doc = lxml.html.fromstring(page_source, base_url=url)
+    doc.make_links_absolute(url, resolve_base_href=True)
+
+    return doc
+
+
+def get_text(elem):
+    # NOTE: Selenium の WebElement.text と同様に，<br> を改行とし，連続する空白は詰める
+    for br in elem.iter("br"):
+        br.tail = "\n" + (br.tail if br.tail is not None else "")
+
+    line_list = map(lambda line: " ".join(line.split()), elem.text_content().split("\n"))
+
+    return "\n".join(filter(lambda line: line != "", line_list))
+
+
+def find_element(elem, xpath):
+    elem_list = elem.xpath(xpath)
+    if len(elem_list) == 0:
+        raise ValueError("Element is not found: {xpath}".format(xpath=xpath))
+
+    return elem_list[0]
+
+
+def xpath_exists(elem, xpath):
+    return len(elem.xpath(xpath)) != 0
+
+
+def parse_order_list(page_source, url):
+    doc = parse_html(page_source, url)
+
+    order_list = []
+    for order_elem in doc.xpath(ORDER_LIST_XPATH):
+        date_text = get_text(
+            find_element(
+                order_elem,
+                './/ul[contains(@class, "hznList")]/li/strong[contains(text(), "注文日")]/following-sibling::span',
+            )
+        )
+        no = get_text(
+            find_element(
+                order_elem,
+                './/ul[contains(@class, "hznList")]/li/strong[contains(text(), "注文番号")]'
+                + "/following-sibling::span",
+            )
+        )
+
+        order_list.append({"date": parse_date(date_text), "no": no})
+
+    return order_list
+
+
+def parse_item(item_elem):
+    thumb_url = find_element(item_elem, './/td[contains(@class, "ecImgArea")]//img').get("src")
+
+    if xpath_exists(item_elem, './/td[contains(@class, "ecPriceArea")]/preceding-sibling::td/p/a'):
+        title = find_element(item_elem, './/td[contains(@class, "ecPriceArea")]/preceding-sibling::td/p/a')
+
+        name = get_text(title).replace("\n", " ")
+        url = title.get("href")
+        item_id = gen_item_id_from_url(url)
+    else:
+        title = find_element(
+            item_elem, './/td[contains(@class, "ecPriceArea")]/preceding-sibling::td/p/strong'
+        )
+        name = get_text(title).replace("\n", " ")
+        url = None
+        item_id = gen_item_id_from_thumb_url(thumb_url)
+
+    if xpath_exists(item_elem, './/p/strong[contains(@class, "red")]/span[contains(text(), "キャンセル")]'):
+        return {"name": name, "cancel": True}
+
+    price_text = get_text(find_element(item_elem, './/td[contains(@class, "ecPriceArea")]/p'))
+    price = int(re.match(r".*?(\d{1,3}(?:,\d{3})*)", price_text).group(1).replace(",", ""))
+
+    count = int(get_text(find_element(item_elem, './/td[contains(@class, "ecQuantityArea")]/span')))
+
+    return {"name": name, "price": price, "count": count, "url": url, "id": item_id, "thumb_url": thumb_url}
+
+
+def parse_order(page_source, url):
+    doc = parse_html(page_source, url)
+
+    date_text = get_text(
+        find_element(doc, '//div[contains(@class, "ecOderStatus")]//li/strong[contains(text(), "注文日")]/..')
+    ).split("：")[1]
+
+    no = get_text(
+        find_element(
+            doc, '//div[contains(@class, "ecOderStatus")]//li/strong[contains(text(), "注文番号")]/..'
+        )
+    ).split("：")[1]
+
+    item_list = []
+    for pos, item_elem in enumerate(doc.xpath(ORDER_ITEM_XPATH)):
+        # NOTE: 同じ注文を再解析した時に重複しないよう，注文内での位置を記録しておく
+        item_list.append(parse_item(item_elem) | {"pos": pos})
+
+    return {
+        "date": parse_date(date_text),
+        "no": no,
+        "item_list": item_list,
+    }
+
+
+def parse_item_detail(page_source, url):
+    doc = parse_html(page_source, url)
+
+    if xpath_exists(doc, '//div[contains(@class, "notFoundMsg")]'):
+        return None
+
+    breadcrumb_list = doc.xpath(
+        '//ul[@itemtype="http://schema.org/BreadcrumbList"]'
+        + '/li[@itemtype="http://schema.org/ListItem"]/a[@itemprop="item"]'
+    )
+    category = list(map(get_text, breadcrumb_list))
+
+    category.pop(0)
+
+    return category
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+    import pprint
+
+    args = docopt(__doc__)
+
+    with open(args["HTML"], "r", encoding="utf-8") as f:
+        page_source = f.read()
+
+    if args["-t"] == "order_list":
+        pprint.pprint(parse_order_list(page_source, args["-u"]))
+    elif args["-t"] == "order":
+        pprint.pprint(parse_order(page_source, args["-u"]))
+    else:
+        pprint.pprint(parse_item_detail(page_source, args["-u"]))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+記録しておいたページを，Web ブラウザを使わずに再解析して購入履歴を作り直します．
+
+Usage:
+  replay.py [-c CONFIG]
+
+Options:
+  -c CONFIG     : CONFIG を設定ファイルとして読み込んで実行します．[default: config.yaml]
+"""
+
+import logging
+import traceback
+
+import store_yodobashi.crawler
+import store_yodobashi.handle
+import store_yodobashi.parser
+
+import local_lib.page_archive
+
+STATUS_REPLAY = "[replay] Order"
+
+
+def replay_item_category(handle, archive, item):
+    if item["url"] is None:
+        return []
+
+    page = local_lib.page_archive.load(archive, store_yodobashi.crawler.PAGE_KIND_ITEM, item["id"])
+    if page is None:
+        return store_yodobashi.handle.get_cached_category(handle, item["id"])
+
+    category = store_yodobashi.parser.parse_item_detail(page["page_source"], page["url"])
+
+    return [] if category is None else category
+
+
+def replay_order(handle, archive, no):
+    page = local_lib.page_archive.load(archive, store_yodobashi.crawler.PAGE_KIND_ORDER, no)
+    order = store_yodobashi.parser.parse_order(page["page_source"], page["url"])
+
+    if len(order["item_list"]) == 0:
+        raise ValueError("No item is found in order {no}".format(no=no))
+
+    item_list = []
+    for item in order["item_list"]:
+        if "cancel" in item:
+            continue
+
+        item |= {"date": order["date"], "no": order["no"]}
+        item.pop("thumb_url")
+        item["category"] = replay_item_category(handle, archive, item)
+
+        item_list.append(item)
+
+    # NOTE: 全ての商品がキャンセルされた注文も，既知の注文として記録できるよう注文単位で返す
+    return {"no": order["no"], "date": order["date"], "item_list": item_list}
+
+
+def replay(handle):
+    archive = store_yodobashi.handle.get_page_archive(handle)
+
+    no_list = local_lib.page_archive.get_key_list(archive, store_yodobashi.crawler.PAGE_KIND_ORDER)
+
+    logging.info("Replay {count:,} orders".format(count=len(no_list)))
+
+    store_yodobashi.handle.set_status(handle, "記録したページを再解析しています...")
+    store_yodobashi.handle.set_progress_bar(handle, STATUS_REPLAY, len(no_list))
+
+    order_list = []
+    for no in no_list:
+        try:
+            order_list.append(replay_order(handle, archive, no))
+        except:
+            # NOTE: 解析できなかった注文は，キャッシュ済みのデータを残しておく
+            logging.warning("Failed to parse order of {no}".format(no=no))
+            logging.debug(traceback.format_exc())
+
+        store_yodobashi.handle.get_progress_bar(handle, STATUS_REPLAY).update()
+
+    for order in order_list:
+        store_yodobashi.handle.record_order_item_list(handle, order["no"], order["date"], order["item_list"])
+
+    store_yodobashi.handle.store_order_info(handle)
+    store_yodobashi.handle.get_progress_bar(handle, STATUS_REPLAY).update()
+
+    logging.info(
+        "Replay complete: {item:,} items, {fail:,} failed orders".format(
+            item=sum(len(order["item_list"]) for order in order_list), fail=len(no_list) - len(order_list)
+        )
+    )
+
+
+if __name__ == "__main__":
+    from docopt import docopt
+
+    import local_lib.logger
+    import local_lib.config
+
+    args = docopt(__doc__)
+
+    local_lib.logger.init("test", level=logging.INFO)
+
+    config = local_lib.config.load(args["-c"])
+    handle = store_yodobashi.handle.create(config)
+
+    replay(handle)
+
+    store_yodobashi.handle.finish(handle)
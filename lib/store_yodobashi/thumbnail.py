@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+商品のサムネイル画像を，Web ブラウザのクッキーを引き継いだ HTTP セッションでバックグラウンド取得します．
+取得した画像は，Excel のセルに収まる大きさに縮小したものも合わせて保存します．
+"""
+
+import concurrent.futures
+import io
+import logging
+import threading
+import traceback
+
+import requests
+import requests.adapters
+import PIL.Image
+
+import local_lib.thumb_store
+
+WORKER_COUNT = 4
+QUEUE_SIZE = 32
+TIMEOUT_SEC = 30
+
+
+def create_session(driver):
+    session = requests.Session()
+
+    adapter = requests.adapters.HTTPAdapter(pool_connections=WORKER_COUNT, pool_maxsize=WORKER_COUNT)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    session.headers.update(
+        {
+            "User-Agent": driver.execute_script("return navigator.userAgent"),
+            "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+            "Referer": driver.current_url,
+        }
+    )
+
+    for cookie in driver.get_cookies():
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"])
+
+    return session
+
+
+def create(driver, worker_count=WORKER_COUNT, queue_size=QUEUE_SIZE):
+    return {
+        "session": create_session(driver),
+        "executor": concurrent.futures.ThreadPoolExecutor(
+            max_workers=worker_count, thread_name_prefix="thumbnail"
+        ),
+        # NOTE: 未処理のジョブが溜まりすぎないよう，キューの長さを制限する
+        "slot": threading.BoundedSemaphore(queue_size),
+        "stat": {"success": 0, "fail": 0},
+        "lock": threading.Lock(),
+    }
+
+
+def get_normalized_key(key, size):
+    return "{key}@{width}x{height}".format(key=key, width=size[0], height=size[1])
+
+
+def normalize(data, size):
+    img = PIL.Image.open(io.BytesIO(data))
+
+    if (img.width <= size[0]) and (img.height <= size[1]):
+        return data
+
+    if img.mode not in ["RGB", "RGBA", "L", "LA", "P"]:
+        img = img.convert("RGB")
+
+    img.thumbnail(size, PIL.Image.LANCZOS)
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+
+    return buf.getvalue()
+
+
+def prepare_normalized(thumb_store, key, size):
+    normalized_key = get_normalized_key(key, size)
+
+    if not local_lib.thumb_store.exists(thumb_store, normalized_key):
+        # NOTE: 縮小版が無い場合は，保存済みの画像から作成してキャッシュしておく
+        data = local_lib.thumb_store.get(thumb_store, key)
+        if data is None:
+            return None
+
+        local_lib.thumb_store.put(thumb_store, normalized_key, normalize(data, size))
+
+    return normalized_key
+
+
+def save(fetcher, thumb_url, thumb_store, key, size):
+    try:
+        res = fetcher["session"].get(thumb_url, timeout=TIMEOUT_SEC)
+        res.raise_for_status()
+
+        local_lib.thumb_store.put(thumb_store, key, res.content)
+        local_lib.thumb_store.put(thumb_store, get_normalized_key(key, size), normalize(res.content, size))
+
+        with fetcher["lock"]:
+            fetcher["stat"]["success"] += 1
+    except:
+        logging.warning("Failed to fetch thumbnail: {url}".format(url=thumb_url))
+        logging.debug(traceback.format_exc())
+        with fetcher["lock"]:
+            fetcher["stat"]["fail"] += 1
+    finally:
+        fetcher["slot"].release()
+
+
+def submit(fetcher, thumb_url, thumb_store, key, size):
+    fetcher["slot"].acquire()
+    fetcher["executor"].submit(save, fetcher, thumb_url, thumb_store, key, size)
+
+
+def finish(fetcher):
+    fetcher["executor"].shutdown(wait=True)
+    fetcher["session"].close()
+
+    logging.info(
+        "Thumbnail: {success:,} fetched, {fail:,} failed".format(
+            success=fetcher["stat"]["success"], fail=fetcher["stat"]["fail"]
+        )
+    )
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pathlib
+import sys
+
+import pytest
+import yaml
+
+PROJECT_DIR = pathlib.Path(__file__).parent.parent
+
+sys.path.append(str(PROJECT_DIR / "lib"))
+
+import store_yodobashi.handle  # noqa: E402
+
+
+@pytest.fixture
+def config(tmp_path):
+    with open(PROJECT_DIR / "config.example.yaml", "r", encoding="utf-8") as file:
+        config = yaml.load(file, Loader=yaml.SafeLoader)
+
+    # NOTE: データやファイルの出力先は，テストごとの一時ディレクトリにする
+    config["base_dir"] = tmp_path
+
+    return config
+
+
+@pytest.fixture
+def create_handle(config):
+    handle_list = []
+
+    def create(backend="pickle"):
+        config["data"]["yodobashi"]["cache"]["backend"] = backend
+        handle = store_yodobashi.handle.create(config)
+        handle_list.append(handle)
+
+        return handle
+
+    yield create
+
+    for handle in handle_list:
+        if "progress_manager" in handle:
+            store_yodobashi.handle.finish(handle)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+import store_yodobashi.handle
+import store_yodobashi.item
+import store_yodobashi.order_db
+
+DATE = datetime.datetime(2020, 1, 1)
+
+
+def gen_item(no, pos, item_id=None, price=100):
+    return {
+        "name": "商品 {no}-{pos}".format(no=no, pos=pos),
+        "price": price,
+        "count": 1,
+        "url": None,
+        "id": "{pos:012d}".format(pos=pos) if item_id is None else item_id,
+        "category": ["家電"],
+        "date": DATE,
+        "no": no,
+        "pos": pos,
+    }
+
+
+def insert_legacy_item(handle, item):
+    # NOTE: 注文内の位置を記録していなかった頃の商品を直接書き込む
+    item = store_yodobashi.item.create(dict(item, pos=None))
+
+    if store_yodobashi.handle.is_db_backend(handle):
+        store_yodobashi.order_db.insert_item(handle["order_db"], item)
+        store_yodobashi.order_db.commit(handle["order_db"])
+    else:
+        handle["order"]["item_list"].append(item)
+        handle["order"]["order_no_stat"][item["no"]] = True
+
+
+def get_item_summary(handle):
+    return [
+        (item["no"], item.get("pos", None), item["id"], item["name"])
+        for item in store_yodobashi.handle.get_item_list(handle)
+    ]
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_refetch_shifted(create_handle, backend):
+    handle = create_handle(backend)
+
+    store_yodobashi.handle.record_order_item_list(
+        handle, "0001", DATE, [gen_item("0001", 0, "A"), gen_item("0001", 1, "B"), gen_item("0001", 2, "C")]
+    )
+    # NOTE: キャンセルで商品の位置がずれた注文を再解析する
+    store_yodobashi.handle.record_order_item_list(
+        handle, "0001", DATE, [gen_item("0001", 0, "A"), gen_item("0001", 1, "C")]
+    )
+
+    assert get_item_summary(handle) == [
+        ("0001", 0, "A", "商品 0001-0"),
+        ("0001", 1, "C", "商品 0001-1"),
+    ]
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_dedup_legacy(create_handle, backend):
+    handle = create_handle(backend)
+
+    legacy_item = gen_item("0001", 0, "A")
+    insert_legacy_item(handle, legacy_item)
+    insert_legacy_item(handle, dict(legacy_item, name="新しい名前"))
+    insert_legacy_item(handle, gen_item("0001", 1, "B"))
+    # NOTE: 価格が異なるものは別の商品として扱う
+    insert_legacy_item(handle, gen_item("0001", 2, "A", price=200))
+
+    assert store_yodobashi.handle.dedup_item_list(handle) == 1
+    assert sorted(get_item_summary(handle)) == [
+        ("0001", None, "A", "商品 0001-2"),
+        ("0001", None, "A", "新しい名前"),
+        ("0001", None, "B", "商品 0001-1"),
+    ]
+
+    assert store_yodobashi.handle.dedup_item_list(handle) == 0
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_dedup_positioned(create_handle, backend):
+    handle = create_handle(backend)
+
+    store_yodobashi.handle.record_order_item_list(
+        handle, "0001", DATE, [gen_item("0001", 0, "A"), gen_item("0001", 1, "A")]
+    )
+    # NOTE: 位置を持つ商品がある注文の以前の商品は，内容が同じでも残す
+    insert_legacy_item(handle, gen_item("0001", 0, "B"))
+    insert_legacy_item(handle, gen_item("0001", 0, "B"))
+
+    assert store_yodobashi.handle.dedup_item_list(handle) == 0
+    assert len(store_yodobashi.handle.get_item_list(handle)) == 4
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_dedup_persist(create_handle, backend):
+    handle = create_handle(backend)
+
+    insert_legacy_item(handle, gen_item("0001", 0, "A"))
+    insert_legacy_item(handle, gen_item("0001", 0, "A"))
+    store_yodobashi.handle.dedup_item_list(handle)
+    store_yodobashi.handle.finish(handle)
+
+    handle = create_handle(backend)
+
+    assert len(store_yodobashi.handle.get_item_list(handle)) == 1
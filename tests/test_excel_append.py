@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+
+import openpyxl
+
+import local_lib.openpyxl_util
+import local_lib.xlsx_append
+import store_yodobashi.handle
+import store_yodobashi.order_history
+
+HEADER_ROW = store_yodobashi.order_history.SHEET_DEF["TABLE_HEADER"]["row"]["pos"]
+NAME_COL = store_yodobashi.order_history.SHEET_DEF["TABLE_HEADER"]["col"]["name"]["pos"]
+
+
+def record_order(handle, index):
+    date = datetime.datetime(2020, 1, 1) + datetime.timedelta(days=index)
+    no = "{index:04d}".format(index=index)
+
+    store_yodobashi.handle.record_order_item_list(
+        handle,
+        no,
+        date,
+        [
+            {
+                "name": "商品 {index}".format(index=index),
+                "price": 100 * index,
+                "count": 1,
+                "url": "https://www.yodobashi.com/product/{index:012d}/".format(index=index),
+                "id": "{index:012d}".format(index=index),
+                "category": ["家電"],
+                "date": date,
+                "no": no,
+                "pos": 0,
+            }
+        ],
+    )
+
+
+def generate(handle, is_full_rebuild=False):
+    excel_file = store_yodobashi.handle.get_excel_file_path(handle)
+    excel_file.parent.mkdir(parents=True, exist_ok=True)
+
+    store_yodobashi.order_history.generate_table_excel(handle, excel_file, False, is_full_rebuild)
+
+    return excel_file
+
+
+def read_sheet(excel_file):
+    book = openpyxl.load_workbook(excel_file)
+    sheet = book.worksheets[0]
+
+    name_list = [
+        sheet.cell(row=row, column=NAME_COL).value for row in range(HEADER_ROW + 1, sheet.max_row + 1)
+    ]
+    link_list = sorted(link.ref for link in sheet._hyperlinks)
+    filter_ref = sheet.auto_filter.ref
+
+    book.close()
+
+    return (name_list, link_list, filter_ref)
+
+
+def test_append(create_handle):
+    handle = create_handle()
+    for index in range(1, 4):
+        record_order(handle, index)
+    excel_file = generate(handle)
+
+    for index in range(4, 6):
+        record_order(handle, index)
+    manifest_count = len(
+        local_lib.openpyxl_util.load_manifest(
+            store_yodobashi.handle.get_excel_manifest_file_path(handle),
+            excel_file,
+            store_yodobashi.order_history.get_sheet_signature(handle, False),
+        )
+    )
+    generate(handle)
+    appended = read_sheet(excel_file)
+
+    generate(handle, True)
+    rebuilt = read_sheet(excel_file)
+
+    assert manifest_count == 3
+    assert appended[0] == ["商品 {index}".format(index=index) for index in range(1, 6)]
+    assert appended == rebuilt
+
+
+def test_up_to_date(create_handle):
+    handle = create_handle()
+    record_order(handle, 1)
+    excel_file = generate(handle)
+    stat = excel_file.stat()
+
+    generate(handle)
+
+    assert excel_file.stat().st_mtime_ns == stat.st_mtime_ns
+
+
+def test_changed_item(create_handle):
+    handle = create_handle()
+    for index in range(1, 3):
+        record_order(handle, index)
+    excel_file = generate(handle)
+
+    # NOTE: 書き出し済みの商品が変わった場合は作り直す
+    store_yodobashi.handle.remove_order_list(handle, ["0001"])
+    generate(handle)
+
+    assert read_sheet(excel_file)[0] == ["商品 2"]
+
+
+def test_get_written_count():
+    base_manifest_item_list = [["a"], ["b"]]
+
+    assert local_lib.openpyxl_util.get_written_count(base_manifest_item_list, [["a"], ["b"], ["c"]]) == 2
+    assert local_lib.openpyxl_util.get_written_count(base_manifest_item_list, [["a"], ["b"]]) == 2
+    assert local_lib.openpyxl_util.get_written_count(base_manifest_item_list, [["a"]]) is None
+    assert local_lib.openpyxl_util.get_written_count(base_manifest_item_list, [["a"], ["x"], ["c"]]) is None
+    assert local_lib.openpyxl_util.get_written_count([], [["a"]]) is None
+
+
+def test_append_broken(create_handle, monkeypatch):
+    handle = create_handle()
+    record_order(handle, 1)
+    excel_file = generate(handle)
+    record_order(handle, 2)
+
+    replace_list = []
+
+    def replace(src, dst):
+        replace_list.append(src)
+        raise OSError("replace")
+
+    monkeypatch.setattr(local_lib.xlsx_append.os, "replace", replace)
+
+    # NOTE: 追記に失敗した場合は，一時ファイルを残さずに全体を作り直す
+    generate(handle)
+
+    assert len(replace_list) == 1
+    assert [path.name for path in excel_file.parent.iterdir()] == [excel_file.name]
+    assert read_sheet(excel_file)[0] == ["商品 1", "商品 2"]
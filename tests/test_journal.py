@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import pickle
+
+import pytest
+
+import local_lib.serializer
+import store_yodobashi.handle
+
+RECORD_LIST = [
+    {"seq": 1, "op": "set_year_list", "args": ([2020, 2021],)},
+    {"seq": 2, "op": "set_order_count", "args": (2020, 3)},
+]
+
+
+def gen_item(no, pos, date=datetime.datetime(2020, 1, 1)):
+    return {
+        "name": "商品 {no}-{pos}".format(no=no, pos=pos),
+        "price": 100,
+        "count": 1,
+        "url": None,
+        "id": "{pos:012d}".format(pos=pos),
+        "category": ["家電"],
+        "date": date,
+        "no": no,
+        "pos": pos,
+    }
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    path = tmp_path / "journal.dat"
+    local_lib.serializer.append(path, RECORD_LIST)
+
+    return path
+
+
+def test_load_journal(journal_path):
+    size = journal_path.stat().st_size
+
+    assert local_lib.serializer.load_journal(journal_path) == RECORD_LIST
+    assert journal_path.stat().st_size == size
+
+
+def test_load_journal_missing(tmp_path):
+    assert local_lib.serializer.load_journal(tmp_path / "journal.dat") == []
+
+
+@pytest.mark.parametrize("cut", [1, 5, -1])
+def test_load_journal_torn_record(journal_path, cut):
+    valid_size = journal_path.stat().st_size
+    record = pickle.dumps({"seq": 3, "op": "set_year_checked", "args": (2020,)})
+
+    # NOTE: 書き込み途中で中断した状態を作る (途中で切れたレコードは EOFError になる)
+    with open(journal_path, "ab") as f:
+        f.write(record[:cut])
+
+    assert local_lib.serializer.load_journal(journal_path) == RECORD_LIST
+    assert journal_path.stat().st_size == valid_size
+
+    local_lib.serializer.append(journal_path, [{"seq": 3, "op": "set_year_checked", "args": (2020,)}])
+
+    assert len(local_lib.serializer.load_journal(journal_path)) == len(RECORD_LIST) + 1
+
+
+def test_load_journal_broken_record(journal_path):
+    valid_size = journal_path.stat().st_size
+
+    with open(journal_path, "ab") as f:
+        f.write(b"\xff\x00broken")
+
+    assert local_lib.serializer.load_journal(journal_path) == RECORD_LIST
+    assert journal_path.stat().st_size == valid_size
+
+
+def test_replay_journal(create_handle):
+    handle = create_handle()
+    store_yodobashi.handle.record_order_item_list(
+        handle, "0001", datetime.datetime(2020, 1, 1), [gen_item("0001", 0), gen_item("0001", 1)]
+    )
+    store_yodobashi.handle.store_order_info(handle)
+
+    journal_path = store_yodobashi.handle.get_journal_file_path(handle)
+    assert journal_path.stat().st_size != 0
+
+    # NOTE: 最後のレコードが途中で切れていても，それまでの内容は復元できる
+    with open(journal_path, "ab") as f:
+        f.write(pickle.dumps({"seq": 100, "op": "set_year_list", "args": ([2020],)})[:-3])
+
+    handle = create_handle()
+
+    assert [item["pos"] for item in store_yodobashi.handle.get_item_list(handle)] == [0, 1]
+    assert store_yodobashi.handle.get_order_stat(handle, "0001")
+    assert store_yodobashi.handle.get_year_list(handle) == []
+
+
+def test_compact_journal(create_handle):
+    handle = create_handle()
+    store_yodobashi.handle.record_order_item_list(
+        handle, "0001", datetime.datetime(2020, 1, 1), [gen_item("0001", 0)]
+    )
+    store_yodobashi.handle.store_order_info(handle)
+    store_yodobashi.handle.compact_order_info(handle)
+
+    assert store_yodobashi.handle.get_journal_file_path(handle).stat().st_size == 0
+
+    handle = create_handle()
+
+    assert len(store_yodobashi.handle.get_item_list(handle)) == 1
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import sqlite3
+
+import store_yodobashi.handle
+import store_yodobashi.order_db
+
+DATE = datetime.datetime(2020, 1, 1)
+
+
+def gen_item(no, pos, date=DATE):
+    return {
+        "name": "商品 {no}-{pos}".format(no=no, pos=pos),
+        "price": 100 * (pos + 1),
+        "count": 1,
+        "url": None,
+        "id": "{pos:012d}".format(pos=pos),
+        "category": ["家電", "パソコン"],
+        "date": date,
+        "no": no,
+        "pos": pos,
+    }
+
+
+def fill_order(handle):
+    store_yodobashi.handle.record_order_item_list(
+        handle, "0001", DATE, [gen_item("0001", 0), gen_item("0001", 1)]
+    )
+    store_yodobashi.handle.record_order_item_list(
+        handle,
+        "0002",
+        DATE + datetime.timedelta(days=1),
+        [gen_item("0002", 0, DATE + datetime.timedelta(days=1))],
+    )
+    # NOTE: 全ての商品がキャンセルされた注文
+    store_yodobashi.handle.record_order_item_list(handle, "0003", DATE, [])
+
+    store_yodobashi.handle.set_year_list(handle, [2020])
+    store_yodobashi.handle.set_order_count(handle, 2020, 3)
+    store_yodobashi.handle.set_year_checked(handle, 2020)
+    store_yodobashi.handle.set_page_checked(handle, 2020, 1)
+    store_yodobashi.handle.store_order_info(handle)
+
+
+def get_item_summary(handle):
+    return [(item["no"], item["pos"], item["name"]) for item in store_yodobashi.handle.get_item_list(handle)]
+
+
+def test_migrate(create_handle):
+    handle = create_handle("pickle")
+    fill_order(handle)
+    expected = get_item_summary(handle)
+    store_yodobashi.handle.finish(handle)
+
+    handle = create_handle("sqlite")
+
+    assert store_yodobashi.order_db.is_migrated(handle["order_db"])
+    assert get_item_summary(handle) == expected
+    for no in ["0001", "0002", "0003"]:
+        assert store_yodobashi.handle.get_order_stat(handle, no)
+    assert not store_yodobashi.handle.get_order_stat(handle, "0004")
+    assert store_yodobashi.handle.get_year_list(handle) == [2020]
+    assert store_yodobashi.handle.get_order_count(handle, 2020) == 3
+    assert store_yodobashi.handle.get_year_checked(handle, 2020)
+    assert store_yodobashi.handle.get_page_checked(handle, 2020, 1)
+    assert not store_yodobashi.handle.get_page_checked(handle, 2020, 2)
+
+
+def test_sqlite_backend(create_handle):
+    handle = create_handle("sqlite")
+    fill_order(handle)
+    store_yodobashi.handle.finish(handle)
+
+    handle = create_handle("sqlite")
+
+    assert get_item_summary(handle) == [
+        ("0001", 0, "商品 0001-0"),
+        ("0001", 1, "商品 0001-1"),
+        ("0002", 0, "商品 0002-0"),
+    ]
+    assert store_yodobashi.handle.get_order_stat(handle, "0003")
+    assert store_yodobashi.handle.get_last_item(handle, 2020)["no"] == "0002"
+    assert store_yodobashi.handle.get_total_order_count(handle) == 3
+
+
+def test_open_legacy_schema(tmp_path):
+    db_path = tmp_path / "order.db"
+
+    # NOTE: 注文の日付を必須にしていた頃のデータベース
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE order_info (no TEXT PRIMARY KEY, date TEXT NOT NULL);
+        INSERT INTO order_info (no, date) VALUES ('0001', '2020-01-01T00:00:00');
+        """)
+    conn.commit()
+    conn.close()
+
+    conn = store_yodobashi.order_db.open_db(db_path)
+    store_yodobashi.order_db.set_order_stat(conn, "0002", None)
+
+    assert store_yodobashi.order_db.get_order_stat(conn, "0001")
+    assert store_yodobashi.order_db.get_order_stat(conn, "0002")
+
+    store_yodobashi.order_db.close(conn)
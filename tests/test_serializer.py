@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import pickle
+import struct
+
+import pytest
+
+import local_lib.serializer
+import store_yodobashi.item
+
+
+def gen_item_list():
+    return [
+        store_yodobashi.item.Item(
+            "商品 {i}".format(i=i),
+            100 * i,
+            1,
+            None,
+            "{i:012d}".format(i=i),
+            None if i % 3 == 0 else ["家電", "パソコン"] if i % 3 == 1 else ["本"],
+            datetime.datetime(2020, 1, 1 + i),
+            "{i:04d}".format(i=i),
+            None if i % 2 == 0 else i,
+        )
+        for i in range(10)
+    ]
+
+
+def get_item_value(item_list):
+    return [tuple(getattr(item, key) for key in store_yodobashi.item.FIELD_LIST) for item in item_list]
+
+
+def test_lazy_dict():
+    data = local_lib.serializer.LazyDict({"a": 1}, 3)
+    local_lib.serializer.set_lazy(data, "b", lambda: 2)
+
+    assert data.version == 3
+    assert "b" in data
+    assert dict.__contains__(data, "b") is False
+    assert len(data) == 2
+    assert list(data) == ["a", "b"]
+    assert data == {"a": 1, "b": 2}
+    assert data.get("b") == 2
+    assert data.get("c", 0) == 0
+    assert (data | {"c": 3}) == {"a": 1, "b": 2, "c": 3}
+
+    local_lib.serializer.set_lazy(data, "c", lambda: 3)
+    assert data.setdefault("c", 0) == 3
+    assert data.pop("c") == 3
+    assert data.pop("c", None) is None
+    with pytest.raises(KeyError):
+        data.pop("c")
+
+    local_lib.serializer.set_lazy(data, "d", lambda: 4)
+    del data["d"]
+    assert "d" not in data
+    with pytest.raises(KeyError):
+        data["d"]
+
+    data.update({"e": 5})
+    assert data.popitem() == ("e", 5)
+
+    restored = pickle.loads(pickle.dumps(data))
+    assert isinstance(restored, local_lib.serializer.LazyDict)
+    assert restored.version == 3
+    assert restored == {"a": 1, "b": 2}
+
+    data.clear()
+    assert len(data) == 0
+    with pytest.raises(KeyError):
+        data.popitem()
+
+
+def test_transform():
+    data = local_lib.serializer.LazyDict({"a": 1})
+    local_lib.serializer.set_lazy(data, "b", lambda: 2)
+
+    local_lib.serializer.transform(data, "a", lambda x: x * 10)
+    local_lib.serializer.transform(data, "b", lambda x: x * 10)
+
+    assert "b" in data.lazy
+    assert data == {"a": 10, "b": 20}
+
+
+def test_item_codec():
+    item_list = gen_item_list()
+
+    restored = store_yodobashi.item.decode_list(
+        pickle.loads(pickle.dumps(store_yodobashi.item.encode_list(item_list)))
+    )
+
+    assert get_item_value(restored) == get_item_value(item_list)
+    assert "pos" not in restored[0]
+    assert restored[1]["pos"] == 1
+    assert restored[0]["category"] is None
+    # NOTE: 同じカテゴリは1つのタプルを共有する
+    assert restored[1]["category"] is restored[4]["category"]
+
+
+@pytest.mark.parametrize("lazy_key_list", [[], ["item_list"]])
+def test_store_load_codec(tmp_path, lazy_key_list):
+    file_path = tmp_path / "cache.dat"
+    item_list = gen_item_list()
+    codec_map = {"item_list": store_yodobashi.item.CODEC}
+
+    assert local_lib.serializer.store(
+        file_path, {"year_list": [2020], "item_list": item_list}, version=2, codec_map=codec_map
+    )
+
+    data = local_lib.serializer.load(
+        file_path, {"year_list": []}, lazy_key_list=lazy_key_list, codec_map=codec_map
+    )
+
+    assert local_lib.serializer.get_version(data) == 2
+    assert data["year_list"] == [2020]
+    assert get_item_value(data["item_list"]) == get_item_value(item_list)
+
+
+def test_load_without_decoder(tmp_path):
+    file_path = tmp_path / "cache.dat"
+    local_lib.serializer.store(
+        file_path, {"item_list": gen_item_list()}, codec_map={"item_list": store_yodobashi.item.CODEC}
+    )
+
+    # NOTE: 変換して保存したセクションを，変換方法なしで読み込もうとした場合は初期値になる
+    data = local_lib.serializer.load(file_path, {"item_list": []})
+
+    assert data == {"item_list": []}
+
+
+def test_store_raw(tmp_path):
+    file_path = tmp_path / "cache.dat"
+    store_path = tmp_path / "store.dat"
+    encode_count = []
+
+    def encode(value):
+        encode_count.append(1)
+        return value
+
+    codec_map = {"item_list": (encode, lambda x: x)}
+
+    local_lib.serializer.store(file_path, {"year_list": [2020], "item_list": [1, 2, 3]}, codec_map=codec_map)
+    data = local_lib.serializer.load(file_path, lazy_key_list=["item_list"], codec_map=codec_map)
+
+    # NOTE: 参照していないセクションは，変換せずにそのまま書き戻す
+    local_lib.serializer.store(store_path, data, codec_map=codec_map)
+
+    assert len(encode_count) == 1
+    assert store_path.read_bytes() == file_path.read_bytes()
+    assert local_lib.serializer.load(store_path, codec_map=codec_map) == {
+        "year_list": [2020],
+        "item_list": [1, 2, 3],
+    }
+
+
+def test_load_version_1(tmp_path):
+    file_path = tmp_path / "cache.dat"
+
+    # NOTE: 変換の有無を索引に含めていなかった頃の形式
+    buf_list = [pickle.dumps([2020]), pickle.dumps([{"name": "商品"}])]
+    index = json.dumps(
+        {
+            "version": 1,
+            "section": [
+                ["year_list", 0, len(buf_list[0])],
+                ["item_list", len(buf_list[0]), len(buf_list[1])],
+            ],
+        }
+    ).encode("utf-8")
+    with open(file_path, "wb") as f:
+        f.write(
+            struct.pack(
+                local_lib.serializer.HEADER_FORMAT,
+                local_lib.serializer.MAGIC,
+                1,
+                local_lib.serializer.COMPRESSION_NONE,
+                len(index),
+            )
+        )
+        f.write(index)
+        for buf in buf_list:
+            f.write(buf)
+
+    data = local_lib.serializer.load(
+        file_path, lazy_key_list=["item_list"], codec_map={"item_list": store_yodobashi.item.CODEC}
+    )
+
+    assert local_lib.serializer.get_version(data) == 1
+    assert data == {"year_list": [2020], "item_list": [{"name": "商品"}]}
+
+
+def test_load_legacy_pickle(tmp_path):
+    file_path = tmp_path / "cache.dat"
+    with open(file_path, "wb") as f:
+        pickle.dump({"year_list": [2020]}, f)
+
+    data = local_lib.serializer.load(file_path, {"year_list": [], "year_count": {}})
+
+    assert local_lib.serializer.get_version(data) == 0
+    assert data == {"year_list": [2020], "year_count": {}}